@@ -1,18 +1,88 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import time
+from typing import Optional
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase
 from app.config import settings
 
-engine = create_engine(settings.DATABASE_URL, echo=settings.DEBUG)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def async_database_url(url: str) -> str:
+    """DATABASE_URL may be a plain postgresql:// URL; the engine always talks asyncpg."""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+def _make_engine(url: str, pool_size: int):
+    return create_async_engine(
+        async_database_url(url),
+        echo=settings.DEBUG,
+        pool_size=pool_size,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=True,
+    )
+
+
+engine = _make_engine(settings.DATABASE_URL, settings.DB_POOL_SIZE)
+replica_engine = (
+    _make_engine(settings.DATABASE_REPLICA_URL, settings.DB_REPLICA_POOL_SIZE)
+    if settings.DATABASE_REPLICA_URL else None
+)
+# expire_on_commit=False: objects stay readable after commit without an implicit
+# (and in async, illegal) lazy reload.
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(
+    replica_engine or engine, class_=AsyncSession, autoflush=False, expire_on_commit=False,
+)
 
 
 class Base(DeclarativeBase):
     pass
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+class RecentWrites:
+    """
+    Keys (donor addresses) that wrote within the last `window` seconds. Kept per
+    process, which covers a donor polling the worker that handled their submit.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._expires: dict[str, float] = {}
+
+    def mark(self, key: str):
+        if self.window <= 0:
+            return
+        now = time.monotonic()
+        self._expires[key] = now + self.window
+        if len(self._expires) > 10000:
+            self._expires = {k: t for k, t in self._expires.items() if t > now}
+
+    def is_recent(self, key: str) -> bool:
+        expires = self._expires.get(key)
+        return expires is not None and expires > time.monotonic()
+
+
+recent_writes = RecentWrites(settings.READ_YOUR_WRITES_SECONDS)
+
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def read_db(recent_key: Optional[str] = None):
+    """
+    Dependency for read-only routes: a replica session, or a primary one when the
+    `recent_key` path parameter (e.g. a donor address) wrote moments ago.
+    """
+    async def get_read_db(request: Request):
+        key = request.path_params.get(recent_key) if recent_key else None
+        maker = SessionLocal if key and recent_writes.is_recent(key) else ReadSessionLocal
+        async with maker() as db:
+            yield db
+
+    return get_read_db
@@ -1,14 +1,15 @@
 import asyncio
 import json
 import logging
-from contextlib import asynccontextmanager
-from typing import Set
+import time
+from contextlib import asynccontextmanager, contextmanager
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.database import Base, engine
+from app.database import engine, replica_engine
+from app.migrations import migrate
 from app.models import *  # noqa: F401,F403 - import all models to register them
 from app.routers import (
     donations_router,
@@ -20,7 +21,12 @@ from app.routers import (
 )
 from app.routers.donation_tracking import router as tracking_router
 from app.services.batch_manager import batch_manager
+from app.services.broadcaster import ws_connections
+from app.services.emergency_jobs import emergency_jobs
 from app.services.escrow_scheduler import escrow_scheduler
+from app.services.wallet_pool import wallet_pool
+from app.services.xrpl_client import xrpl_client
+from app.utils.metrics import metrics
 
 logging.basicConfig(
     level=logging.INFO,
@@ -28,109 +34,57 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# WebSocket connections
-ws_connections: Set[WebSocket] = set()
 
-
-async def broadcast(event: dict):
-    dead = set()
-    for ws in ws_connections:
-        try:
-            await ws.send_json(event)
-        except Exception:
-            dead.add(ws)
-    ws_connections.difference_update(dead)
+@contextmanager
+def startup_phase(name: str):
+    start = time.perf_counter()
+    yield
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    metrics.set_gauge(f"startup.{name}_ms", round(elapsed_ms, 1))
+    logger.info(f"Startup phase '{name}' took {elapsed_ms:.0f}ms")
 
 
-def seed_organizations():
-    """Seed default organizations if they don't exist."""
-    import json as _json
+async def active_disaster_addresses() -> list[str]:
+    """Disaster wallets that still have escrows in flight, for the ledger stream subscription."""
+    from sqlalchemy import select
     from app.database import SessionLocal
-    from app.models.organization import Organization
+    from app.models.disaster import Disaster
 
-    db = SessionLocal()
-    try:
-        if db.query(Organization).count() > 0:
-            return
-
-        accounts_path = ".secrets/xrpl_accounts.json"
-        try:
-            import os
-            root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            full_path = os.path.join(root, accounts_path)
-            with open(full_path) as f:
-                accounts = _json.load(f)
-        except FileNotFoundError:
-            full_path = os.path.join(os.getcwd(), "..", accounts_path)
-            with open(full_path) as f:
-                accounts = _json.load(f)
-
-        org_definitions = [
-            {"name": "Hospital-A", "cause_type": "health", "need_score": 8, "account_name": "Hospital-A"},
-            {"name": "Shelter-B", "cause_type": "shelter", "need_score": 6, "account_name": "Shelter-B"},
-            {"name": "NGO-C", "cause_type": "food", "need_score": 7, "account_name": "NGO-C"},
-        ]
-
-        account_map = {a["name"]: a["address"] for a in accounts}
-
-        for org_def in org_definitions:
-            address = account_map.get(org_def["account_name"])
-            if not address:
-                logger.warning(f"No wallet found for {org_def['account_name']}")
-                continue
-
-            org = Organization(
-                name=org_def["name"],
-                cause_type=org_def["cause_type"],
-                wallet_address=address,
-                need_score=org_def["need_score"],
-            )
-            db.add(org)
-
-        db.commit()
-        logger.info("Seeded 3 organizations into database")
-    except Exception as e:
-        logger.error(f"Failed to seed organizations: {e}")
-        db.rollback()
-    finally:
-        db.close()
+    async with SessionLocal() as db:
+        rows = await db.execute(select(Disaster.wallet_address).filter_by(status="active"))
+        return [r[0] for r in rows]
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    logger.info("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created")
-
-    # Inline migrations
-    from sqlalchemy import text
-    migrations = [
-        ("donations", "currency", "ALTER TABLE donations ADD COLUMN currency VARCHAR(10) DEFAULT 'XRP' NOT NULL"),
-        ("disasters", "total_rlusd_allocated_drops", "ALTER TABLE disasters ADD COLUMN total_rlusd_allocated_drops BIGINT DEFAULT 0 NOT NULL"),
-        ("org_escrows", "currency", "ALTER TABLE org_escrows ADD COLUMN currency VARCHAR(10) DEFAULT 'XRP' NOT NULL"),
-    ]
-    for table, col, sql in migrations:
-        try:
-            with engine.connect() as conn:
-                conn.execute(text(sql))
-                conn.commit()
-                logger.info(f"Added '{col}' column to {table} table")
-        except Exception:
-            pass  # Column already exists
-
-    seed_organizations()
+    with startup_phase("migrations"):
+        await migrate()
+    with startup_phase("recover_jobs"):
+        await emergency_jobs.mark_interrupted()
+
+    with startup_phase("xrpl_connect"):
+        await xrpl_client.start(watch_accounts=await active_disaster_addresses())
+    logger.info(f"XRPL connection pools ready ({len(xrpl_client.nodes.nodes)} nodes x {settings.XRPL_POOL_SIZE} connections), ledger stream started")
 
     # Start background tasks
     batch_task = asyncio.create_task(batch_manager.run())
     scheduler_task = asyncio.create_task(escrow_scheduler.run())
-    logger.info("Background services started (batch manager + escrow scheduler)")
+    wallet_pool_task = asyncio.create_task(wallet_pool.run())
+    jobs_task = asyncio.create_task(emergency_jobs.run())
+    logger.info("Background services started (batch manager + escrow scheduler + warm wallet pool + job heartbeat)")
 
     yield
 
     # Shutdown
     batch_task.cancel()
     scheduler_task.cancel()
+    wallet_pool_task.cancel()
+    jobs_task.cancel()
+    await xrpl_client.close()
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
     logger.info("Background services stopped")
 
 
@@ -174,6 +128,11 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
     await ws.accept()
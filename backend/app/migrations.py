@@ -0,0 +1,199 @@
+"""
+Versioned schema migrations, run once per deploy instead of on every process start.
+
+The schema_version table has a row per applied migration. A warm database costs one
+`SELECT max(version)`; otherwise the first worker to take the advisory lock applies
+the pending migrations, each in its own transaction, while the others wait on the
+lock and then find nothing left to do. Migrations are written to be idempotent
+(IF NOT EXISTS, count checks) so databases created before versioning upgrade cleanly.
+"""
+import json
+import logging
+import os
+import time
+from typing import Optional
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.exc import DBAPIError
+from app.database import Base, engine
+import app.models  # noqa: F401 - register every table for the baseline
+from app.models.organization import Organization
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key shared by every worker ("PulseX" in ASCII)
+MIGRATION_LOCK_ID = 0x50756C736558
+
+
+async def _baseline(conn):
+    await conn.run_sync(Base.metadata.create_all)
+
+
+async def _pre_versioning_columns(conn):
+    # Changes that used to be blind ALTERs in main.lifespan; no-ops on tables
+    # the baseline just created.
+    for sql in (
+        "ALTER TABLE donations ADD COLUMN IF NOT EXISTS currency VARCHAR(10) DEFAULT 'XRP' NOT NULL",
+        "ALTER TABLE disasters ADD COLUMN IF NOT EXISTS total_rlusd_allocated_drops BIGINT DEFAULT 0 NOT NULL",
+        "ALTER TABLE org_escrows ADD COLUMN IF NOT EXISTS currency VARCHAR(10) DEFAULT 'XRP' NOT NULL",
+        "CREATE INDEX IF NOT EXISTS ix_batch_escrows_status_finish_after ON batch_escrows (status, finish_after)",
+        "CREATE INDEX IF NOT EXISTS ix_org_escrows_status_finish_after ON org_escrows (status, finish_after)",
+    ):
+        await conn.execute(text(sql))
+
+
+def _load_accounts() -> Optional[list[dict]]:
+    accounts_path = os.path.join(".secrets", "xrpl_accounts.json")
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    for full_path in (os.path.join(root, accounts_path), os.path.join(os.getcwd(), "..", accounts_path)):
+        try:
+            with open(full_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            continue
+    return None
+
+
+async def _seed_organizations(conn):
+    if await conn.scalar(select(func.count()).select_from(Organization.__table__)) > 0:
+        return
+
+    accounts = _load_accounts()
+    if accounts is None:
+        logger.warning("No .secrets/xrpl_accounts.json; run scripts/seed_demo_data.py to add organizations")
+        return
+
+    org_definitions = [
+        {"name": "Hospital-A", "cause_type": "health", "need_score": 8},
+        {"name": "Shelter-B", "cause_type": "shelter", "need_score": 6},
+        {"name": "NGO-C", "cause_type": "food", "need_score": 7},
+    ]
+    account_map = {a["name"]: a["address"] for a in accounts}
+
+    rows = []
+    for org_def in org_definitions:
+        address = account_map.get(org_def["name"])
+        if not address:
+            logger.warning(f"No wallet found for {org_def['name']}")
+            continue
+        rows.append({**org_def, "wallet_address": address})
+
+    if rows:
+        await conn.execute(insert(Organization.__table__), rows)
+        logger.info(f"Seeded {len(rows)} organizations into database")
+
+
+async def _hot_path_indexes(conn):
+    # Composite and partial indexes matching the batcher, scheduler and donor-page
+    # queries; the single-column indexes they make redundant go.
+    for sql in (
+        "CREATE INDEX IF NOT EXISTS ix_donations_pending ON donations (currency, created_at, id)"
+        " INCLUDE (amount_drops) WHERE batch_status = 'pending'",
+        "CREATE INDEX IF NOT EXISTS ix_donations_sealing ON donations (batch_id) WHERE batch_status = 'sealing'",
+        "CREATE INDEX IF NOT EXISTS ix_donations_batch_id ON donations (batch_id)",
+        "CREATE INDEX IF NOT EXISTS ix_donations_donor_created ON donations (donor_address, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_org_escrows_locked_finish_after ON org_escrows (finish_after, disaster_id)"
+        " WHERE status = 'locked'",
+        "CREATE INDEX IF NOT EXISTS ix_org_escrows_disaster_status ON org_escrows (disaster_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_disasters_created_at ON disasters (created_at, disaster_id)",
+        "DROP INDEX IF EXISTS ix_donations_donor_address",
+        "DROP INDEX IF EXISTS ix_donations_batch_status",
+        "DROP INDEX IF EXISTS ix_org_escrows_status_finish_after",
+        "DROP INDEX IF EXISTS ix_org_escrows_disaster_id",
+        "DROP INDEX IF EXISTS ix_org_escrows_status",
+    ):
+        await conn.execute(text(sql))
+
+
+async def _time_ordered_ids(conn):
+    # Rows written before app.utils.ids.uuid7 have random v4 ids. Give each a v7 id
+    # built from its created_at (v4 and v7 never collide: the version nibble differs)
+    # and carry donation_lineage across. Already-v7 rows are left alone.
+    await conn.execute(text("""
+        CREATE FUNCTION pg_temp.uuid7_at(ts timestamptz) RETURNS uuid AS $$
+            SELECT encode(set_bit(set_bit(overlay(uuid_send(gen_random_uuid())
+                   PLACING substring(int8send(floor(extract(epoch FROM ts) * 1000)::bigint) FROM 3)
+                   FROM 1 FOR 6), 52, 1), 53, 1), 'hex')::uuid
+        $$ LANGUAGE sql VOLATILE
+    """))
+    for table, fk_column in (("donations", "donation_id"), ("org_escrows", "org_escrow_id")):
+        await conn.execute(text(f"""
+            CREATE TEMP TABLE {table}_id_map ON COMMIT DROP AS
+            SELECT id AS old_id, pg_temp.uuid7_at(coalesce(created_at, now())) AS new_id
+            FROM {table} WHERE substring(id::text, 15, 1) <> '7'
+        """))
+        await conn.execute(text(f"ALTER TABLE donation_lineage DROP CONSTRAINT IF EXISTS donation_lineage_{fk_column}_fkey"))
+        await conn.execute(text(f"UPDATE {table} t SET id = m.new_id FROM {table}_id_map m WHERE t.id = m.old_id"))
+        await conn.execute(text(
+            f"UPDATE donation_lineage l SET {fk_column} = m.new_id"
+            f" FROM {table}_id_map m WHERE l.{fk_column} = m.old_id"
+        ))
+        await conn.execute(text(
+            f"ALTER TABLE donation_lineage ADD CONSTRAINT donation_lineage_{fk_column}_fkey"
+            f" FOREIGN KEY ({fk_column}) REFERENCES {table} (id)"
+        ))
+
+
+# (version, description, step). Append only: never renumber or edit an applied step.
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "columns and indexes added before versioning", _pre_versioning_columns),
+    (3, "seed organizations", _seed_organizations),
+    (4, "composite and partial indexes for hot queries", _hot_path_indexes),
+    (5, "time-ordered ids for donations and org escrows", _time_ordered_ids),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def _current_version(conn) -> int:
+    try:
+        return await conn.scalar(text("SELECT coalesce(max(version), 0) FROM schema_version"))
+    except DBAPIError:
+        await conn.rollback()
+        return 0
+
+
+async def migrate() -> int:
+    """Bring the database up to SCHEMA_VERSION; returns how many migrations this worker applied."""
+    async with engine.connect() as conn:
+        version = await _current_version(conn)
+        await conn.commit()
+        if version >= SCHEMA_VERSION:
+            logger.info(f"Schema at version {version}, nothing to migrate")
+            return 0
+
+        # Session-level lock on this connection; held across the per-migration commits.
+        await conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        await conn.commit()
+        try:
+            await conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                " version INTEGER PRIMARY KEY,"
+                " description VARCHAR(200) NOT NULL,"
+                " duration_ms INTEGER NOT NULL,"
+                " applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+            ))
+            await conn.commit()
+
+            # Re-read under the lock: another worker may have migrated while we waited
+            version = await _current_version(conn)
+            applied = 0
+            for number, description, step in MIGRATIONS:
+                if number <= version:
+                    continue
+                start = time.perf_counter()
+                await step(conn)
+                duration_ms = int((time.perf_counter() - start) * 1000)
+                await conn.execute(
+                    text("INSERT INTO schema_version (version, description, duration_ms) VALUES (:v, :d, :ms)"),
+                    {"v": number, "d": description, "ms": duration_ms},
+                )
+                await conn.commit()
+                applied += 1
+                logger.info(f"Applied migration {number} ({description}) in {duration_ms}ms")
+            return applied
+        except Exception:
+            await conn.rollback()
+            raise
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            await conn.commit()
@@ -3,5 +3,8 @@ from app.models.batch_escrow import BatchEscrow
 from app.models.disaster import Disaster
 from app.models.organization import Organization
 from app.models.org_escrow import OrgEscrow
+from app.models.warm_wallet import WarmWallet
+from app.models.emergency_job import EmergencyJob
+from app.models.donation_lineage import DonationLineage
 
-__all__ = ["Donation", "BatchEscrow", "Disaster", "Organization", "OrgEscrow"]
+__all__ = ["Donation", "BatchEscrow", "Disaster", "Organization", "OrgEscrow", "WarmWallet", "EmergencyJob", "DonationLineage"]
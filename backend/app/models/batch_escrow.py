@@ -1,10 +1,14 @@
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, BigInteger, Integer, DateTime
+from sqlalchemy import Column, String, BigInteger, Integer, DateTime, Index
 from app.database import Base
 
 
 class BatchEscrow(Base):
     __tablename__ = "batch_escrows"
+    __table_args__ = (
+        # The escrow scheduler rebuilds its finish-time heap from locked rows in finish order.
+        Index("ix_batch_escrows_status_finish_after", "status", "finish_after"),
+    )
 
     batch_id = Column(String(64), primary_key=True)
     escrow_tx_hash = Column(String(128), unique=True, nullable=False)
@@ -1,10 +1,14 @@
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, BigInteger, Integer, DateTime, Text
+from sqlalchemy import Column, String, BigInteger, Integer, DateTime, Index, Text
 from app.database import Base
 
 
 class Disaster(Base):
     __tablename__ = "disasters"
+    __table_args__ = (
+        # Emergency list pages and the lineage join's created_at range
+        Index("ix_disasters_created_at", "created_at", "disaster_id"),
+    )
 
     disaster_id = Column(String(64), primary_key=True)
     wallet_address = Column(String(64), unique=True, nullable=False)
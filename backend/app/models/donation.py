@@ -1,18 +1,30 @@
-import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, BigInteger, DateTime
+from sqlalchemy import Column, String, BigInteger, DateTime, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from app.database import Base
+from app.utils.ids import uuid7
 
 
 class Donation(Base):
     __tablename__ = "donations"
+    __table_args__ = (
+        # Batch sealing: the pending backlog per currency in (created_at, id) order, with
+        # amount_drops included so the trigger's count/sum is an index-only scan.
+        Index(
+            "ix_donations_pending", "currency", "created_at", "id",
+            postgresql_include=["amount_drops"], postgresql_where=text("batch_status = 'pending'"),
+        ),
+        # Stale-claim recovery: the few `sealing` rows, grouped by batch
+        Index("ix_donations_sealing", "batch_id", postgresql_where=text("batch_status = 'sealing'")),
+        # Donor status and tracking pages
+        Index("ix_donations_donor_created", "donor_address", "created_at", "id"),
+    )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    donor_address = Column(String(64), nullable=False, index=True)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    donor_address = Column(String(64), nullable=False)
     amount_drops = Column(BigInteger, nullable=False)
     payment_tx_hash = Column(String(128), unique=True, nullable=False)
-    batch_id = Column(String(64), nullable=True)
+    batch_id = Column(String(64), nullable=True, index=True)
     currency = Column(String(10), default="XRP", nullable=False)
-    batch_status = Column(String(20), default="pending", index=True)
+    batch_status = Column(String(20), default="pending")
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, BigInteger, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+
+class DonationLineage(Base):
+    """
+    Where a donation ended up: one row per (donation, org escrow) it helped fund, with
+    the donation's pro-rata share of that escrow. Maintained by app.services.lineage.
+    """
+
+    __tablename__ = "donation_lineage"
+    __table_args__ = (
+        UniqueConstraint("donation_id", "org_escrow_id", name="uq_donation_lineage_donation_escrow"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    donation_id = Column(UUID(as_uuid=True), ForeignKey("donations.id"), nullable=False, index=True)
+    batch_id = Column(String(64), ForeignKey("batch_escrows.batch_id"), nullable=False)
+    disaster_id = Column(String(64), ForeignKey("disasters.disaster_id"), nullable=False, index=True)
+    org_escrow_id = Column(UUID(as_uuid=True), ForeignKey("org_escrows.id"), nullable=False)
+    share_drops = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, DateTime, Text, JSON
+from app.database import Base
+
+
+class EmergencyJob(Base):
+    """An emergency trigger running in the background, with the state of each step."""
+
+    __tablename__ = "emergency_jobs"
+
+    job_id = Column(String(64), primary_key=True)
+    status = Column(String(20), default="queued", index=True)  # queued, running, completed, failed, interrupted
+    step = Column(String(50), nullable=True)
+    request = Column(JSON, nullable=False)
+    progress = Column(JSON, default=dict, nullable=False)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    disaster_id = Column(String(64), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -1,22 +1,31 @@
-import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, BigInteger, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, String, BigInteger, Integer, DateTime, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from app.database import Base
+from app.utils.ids import uuid7
 
 
 class OrgEscrow(Base):
     __tablename__ = "org_escrows"
+    __table_args__ = (
+        # The escrow scheduler only ever looks for locked escrows by finish time.
+        Index(
+            "ix_org_escrows_locked_finish_after", "finish_after", "disaster_id",
+            postgresql_where=text("status = 'locked'"),
+        ),
+        # Per-disaster lanes, completion checks and the emergency list's status counts
+        Index("ix_org_escrows_disaster_status", "disaster_id", "status"),
+    )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    disaster_id = Column(String(64), ForeignKey("disasters.disaster_id"), nullable=False, index=True)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    disaster_id = Column(String(64), ForeignKey("disasters.disaster_id"), nullable=False)
     org_id = Column(Integer, ForeignKey("organizations.org_id"), nullable=False, index=True)
     org_address = Column(String(64), nullable=False)
     escrow_tx_hash = Column(String(128), unique=True, nullable=False)
     finish_tx_hash = Column(String(128), nullable=True)
     amount_drops = Column(BigInteger, nullable=False)
     currency = Column(String(10), default="XRP", nullable=False)
-    status = Column(String(20), default="locked", index=True)
+    status = Column(String(20), default="locked")
     finish_after = Column(Integer, nullable=False)
     cancel_after = Column(Integer, nullable=True)
     sequence = Column(Integer, nullable=True)
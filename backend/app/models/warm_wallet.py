@@ -0,0 +1,16 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, Boolean, DateTime, Text
+from app.database import Base
+
+
+class WarmWallet(Base):
+    """A disaster wallet activated ahead of time, waiting to be claimed by an emergency trigger."""
+
+    __tablename__ = "warm_wallets"
+
+    address = Column(String(64), primary_key=True)
+    seed_encrypted = Column(Text, nullable=False)
+    has_trustline = Column(Boolean, default=False, nullable=False)
+    status = Column(String(20), default="ready", index=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
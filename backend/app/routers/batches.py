@@ -1,20 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import read_db
 from app.models.batch_escrow import BatchEscrow
 from app.models.donation import Donation
+from app.utils.pagination import PageParams, paginate
+from app.utils.query_budget import query_budget
 from app.utils.ripple_time import from_drops
 
 router = APIRouter(prefix="/api/batches", tags=["batches"])
 
 
 @router.get("")
-async def list_batches(db: Session = Depends(get_db)):
-    batches = db.query(BatchEscrow).order_by(BatchEscrow.created_at.desc()).all()
+@query_budget(2)
+async def list_batches(page: PageParams = Depends(), db: AsyncSession = Depends(read_db())):
+    batches, next_cursor = await paginate(
+        db, select(BatchEscrow), BatchEscrow.created_at, BatchEscrow.batch_id, page,
+    )
 
-    total_locked = sum(b.total_amount_drops for b in batches if b.status == "locked")
-    active = sum(1 for b in batches if b.status == "locked")
-    finished = sum(1 for b in batches if b.status == "finished")
+    total_locked, active, finished = (await db.execute(select(
+        func.coalesce(func.sum(BatchEscrow.total_amount_drops).filter(BatchEscrow.status == "locked"), 0),
+        func.count(BatchEscrow.batch_id).filter(BatchEscrow.status == "locked"),
+        func.count(BatchEscrow.batch_id).filter(BatchEscrow.status == "finished"),
+    ))).one()
 
     return {
         "batches": [
@@ -32,6 +40,7 @@ async def list_batches(db: Session = Depends(get_db)):
             }
             for b in batches
         ],
+        "next_cursor": next_cursor,
         "stats": {
             "total_locked_xrp": from_drops(total_locked),
             "active_batches": active,
@@ -41,12 +50,13 @@ async def list_batches(db: Session = Depends(get_db)):
 
 
 @router.get("/{batch_id}")
-async def get_batch(batch_id: str, db: Session = Depends(get_db)):
-    batch = db.query(BatchEscrow).filter_by(batch_id=batch_id).first()
+@query_budget(2)
+async def get_batch(batch_id: str, db: AsyncSession = Depends(read_db())):
+    batch = await db.get(BatchEscrow, batch_id)
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
 
-    donations = db.query(Donation).filter_by(batch_id=batch_id).all()
+    donations = (await db.execute(select(Donation).filter_by(batch_id=batch_id))).scalars().all()
 
     return {
         "batch_id": batch.batch_id,
@@ -2,147 +2,147 @@
 Donation tracking endpoint - shows donors how their funds were used
 """
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import read_db
 from app.models.donation import Donation
+from app.models.donation_lineage import DonationLineage
 from app.models.batch_escrow import BatchEscrow
 from app.models.disaster import Disaster
 from app.models.org_escrow import OrgEscrow
 from app.models.organization import Organization
+from app.utils.pagination import PageParams, paginate
+from app.utils.query_budget import query_budget
 from app.utils.ripple_time import from_drops
 
 router = APIRouter(prefix="/api/donations", tags=["donations"])
 
 
 @router.get("/track/{donor_address}")
-def track_donations(donor_address: str, db: Session = Depends(get_db)):
+@query_budget(3)
+async def track_donations(donor_address: str, page: PageParams = Depends(), db: AsyncSession = Depends(read_db("donor_address"))):
     """
     Get detailed tracking for all donations by a donor, including:
     - Current status in the flow
     - Which batch they're in (if batched)
     - Which disaster they funded (if allocated)
     - Which organizations received their funds (if distributed)
-    """
-    # Get all donations by this donor
-    donations = db.query(Donation).filter(
-        Donation.donor_address == donor_address
-    ).order_by(Donation.created_at.desc()).all()
-
-    tracked_donations = []
-    for donation in donations:
-        tracking = {
-            "donation_id": str(donation.id),
-            "amount_xrp": from_drops(donation.amount_drops),
-            "currency": getattr(donation, 'currency', 'XRP'),
-            "payment_tx_hash": donation.payment_tx_hash,
-            "created_at": donation.created_at.isoformat(),
-            "status": donation.batch_status,
-            "batch_id": donation.batch_id,
-            "lifecycle": {
-                "received": True,
-                "batched": False,
-                "released_to_reserve": False,
-                "allocated_to_disaster": False,
-                "sent_to_orgs": False,
-                "released_to_orgs": False,
-            },
-            "batch_info": None,
-            "disaster_allocations": [],
-        }
-
-        # Check batch status
-        if donation.batch_id:
-            tracking["lifecycle"]["batched"] = True
-
-            # Get batch escrow details
-            batch = db.query(BatchEscrow).filter(
-                BatchEscrow.batch_id == donation.batch_id
-            ).first()
-
-            if batch:
-                tracking["batch_info"] = {
-                    "batch_id": batch.batch_id,
-                    "escrow_tx_hash": batch.escrow_tx_hash,
-                    "finish_tx_hash": batch.finish_tx_hash,
-                    "status": batch.status,
-                    "total_amount_xrp": from_drops(batch.total_amount_drops),
-                    "donor_count": batch.donor_count,
-                    "created_at": batch.created_at.isoformat(),
-                    "finished_at": batch.finished_at.isoformat() if batch.finished_at else None,
-                }
-
-                if batch.status == "finished":
-                    tracking["lifecycle"]["released_to_reserve"] = True
-
-                    # Calculate pro-rata share: this donation's contribution to the batch
-                    donation_drops = donation.amount_drops
-                    batch_total_drops = batch.total_amount_drops
-                    donation_share_pct = (donation_drops / batch_total_drops) * 100 if batch_total_drops > 0 else 0
-
-                    # Find disasters that were funded after this batch was released
-                    if batch.finished_at:
-                        disasters = db.query(Disaster).filter(
-                            Disaster.created_at >= batch.finished_at
-                        ).order_by(Disaster.created_at).all()
-
-                        for disaster in disasters:
-                            tracking["lifecycle"]["allocated_to_disaster"] = True
-
-                            # Calculate this donor's pro-rata share of the disaster allocation
-                            disaster_total_drops = disaster.total_allocated_drops
-                            donor_share_drops = int(disaster_total_drops * donation_drops / batch_total_drops) if batch_total_drops > 0 else 0
-                            donor_share_xrp = from_drops(donor_share_drops)
 
-                            # Get org escrows for this disaster with organization details
-                            org_escrows = db.query(OrgEscrow, Organization).join(
-                                Organization, OrgEscrow.org_id == Organization.org_id
-                            ).filter(OrgEscrow.disaster_id == disaster.disaster_id).all()
-
-                            disaster_allocation = {
-                                "disaster_id": disaster.disaster_id,
-                                "disaster_type": disaster.disaster_type,
-                                "location": disaster.location,
-                                "severity": disaster.severity,
-                                "total_allocated_xrp": from_drops(disaster.total_allocated_drops),
-                                "your_share_xrp": donor_share_xrp,
-                                "your_share_pct": round(donation_share_pct, 2),
-                                "status": disaster.status,
-                                "created_at": disaster.created_at.isoformat(),
-                                "organizations": [],
-                            }
-
-                            if org_escrows:
-                                tracking["lifecycle"]["sent_to_orgs"] = True
-
-                            for org_escrow, org in org_escrows:
-                                # Calculate donor's share of this org's allocation
-                                org_total_drops = org_escrow.amount_drops
-                                donor_org_share_drops = int(org_total_drops * donation_drops / batch_total_drops) if batch_total_drops > 0 else 0
-                                donor_org_share_xrp = from_drops(donor_org_share_drops)
-
-                                org_info = {
-                                    "org_name": org.name,
-                                    "cause_type": org.cause_type,
-                                    "total_amount_xrp": from_drops(org_escrow.amount_drops),
-                                    "your_share_xrp": donor_org_share_xrp,
-                                    "escrow_tx_hash": org_escrow.escrow_tx_hash,
-                                    "finish_tx_hash": org_escrow.finish_tx_hash,
-                                    "status": org_escrow.status,
-                                    "created_at": org_escrow.created_at.isoformat(),
-                                    "finished_at": org_escrow.finished_at.isoformat() if org_escrow.finished_at else None,
-                                }
+    Reads the donation_lineage table (see app.services.lineage): after the page of
+    donations, their whole history is one query with a row per org escrow funded.
+    """
+    donations, next_cursor = await paginate(
+        db, select(Donation).where(Donation.donor_address == donor_address),
+        Donation.created_at, Donation.id, page,
+    )
+    # Totals over every donation, not just this page
+    total_donations, total_xrp_drops, total_rlusd_drops = (await db.execute(
+        select(
+            func.count(Donation.id),
+            func.coalesce(func.sum(Donation.amount_drops).filter(Donation.currency == "XRP"), 0),
+            func.coalesce(func.sum(Donation.amount_drops).filter(Donation.currency == "RLUSD"), 0),
+        ).where(Donation.donor_address == donor_address)
+    )).one()
+
+    rows = []
+    if donations:
+        rows = (await db.execute(
+            select(Donation, BatchEscrow, DonationLineage, Disaster, OrgEscrow, Organization)
+            .outerjoin(BatchEscrow, BatchEscrow.batch_id == Donation.batch_id)
+            .outerjoin(DonationLineage, DonationLineage.donation_id == Donation.id)
+            .outerjoin(Disaster, Disaster.disaster_id == DonationLineage.disaster_id)
+            .outerjoin(OrgEscrow, OrgEscrow.id == DonationLineage.org_escrow_id)
+            .outerjoin(Organization, Organization.org_id == OrgEscrow.org_id)
+            .where(Donation.id.in_([d.id for d in donations]))
+            .order_by(Donation.created_at.desc(), Donation.id.desc(), Disaster.created_at, OrgEscrow.created_at)
+        )).all()
+
+    tracked: dict = {}
+    for donation, batch, lineage, disaster, org_escrow, org in rows:
+        tracking = tracked.get(donation.id)
+        if tracking is None:
+            tracking = tracked[donation.id] = _donation_tracking(donation, batch)
+        if lineage is None:
+            continue
+
+        tracking["lifecycle"]["allocated_to_disaster"] = True
+        tracking["lifecycle"]["sent_to_orgs"] = True
+        allocations = tracking["disaster_allocations"]
+        if not allocations or allocations[-1]["disaster_id"] != disaster.disaster_id:
+            allocations.append(_disaster_allocation(donation, batch, disaster))
+
+        if org_escrow.status == "finished":
+            tracking["lifecycle"]["released_to_orgs"] = True
+        allocations[-1]["organizations"].append({
+            "org_name": org.name,
+            "cause_type": org.cause_type,
+            "total_amount_xrp": from_drops(org_escrow.amount_drops),
+            "your_share_xrp": from_drops(lineage.share_drops),
+            "escrow_tx_hash": org_escrow.escrow_tx_hash,
+            "finish_tx_hash": org_escrow.finish_tx_hash,
+            "status": org_escrow.status,
+            "created_at": org_escrow.created_at.isoformat(),
+            "finished_at": org_escrow.finished_at.isoformat() if org_escrow.finished_at else None,
+        })
 
-                                if org_escrow.status == "finished":
-                                    tracking["lifecycle"]["released_to_orgs"] = True
+    return {
+        "donor_address": donor_address,
+        "total_donations": total_donations,
+        "total_donated_xrp": from_drops(total_xrp_drops),
+        "total_donated_rlusd": from_drops(total_rlusd_drops),
+        "donations": list(tracked.values()),
+        "next_cursor": next_cursor,
+    }
 
-                                disaster_allocation["organizations"].append(org_info)
 
-                            tracking["disaster_allocations"].append(disaster_allocation)
+def _donation_tracking(donation: Donation, batch) -> dict:
+    tracking = {
+        "donation_id": str(donation.id),
+        "amount_xrp": from_drops(donation.amount_drops),
+        "currency": donation.currency or "XRP",
+        "payment_tx_hash": donation.payment_tx_hash,
+        "created_at": donation.created_at.isoformat(),
+        "status": donation.batch_status,
+        "batch_id": donation.batch_id,
+        "lifecycle": {
+            "received": True,
+            "batched": bool(donation.batch_id),
+            "released_to_reserve": False,
+            "allocated_to_disaster": False,
+            "sent_to_orgs": False,
+            "released_to_orgs": False,
+        },
+        "batch_info": None,
+        "disaster_allocations": [],
+    }
+    if batch:
+        tracking["batch_info"] = {
+            "batch_id": batch.batch_id,
+            "escrow_tx_hash": batch.escrow_tx_hash,
+            "finish_tx_hash": batch.finish_tx_hash,
+            "status": batch.status,
+            "total_amount_xrp": from_drops(batch.total_amount_drops),
+            "donor_count": batch.donor_count,
+            "created_at": batch.created_at.isoformat(),
+            "finished_at": batch.finished_at.isoformat() if batch.finished_at else None,
+        }
+        if batch.status == "finished":
+            tracking["lifecycle"]["released_to_reserve"] = True
+    return tracking
 
-        tracked_donations.append(tracking)
 
+def _disaster_allocation(donation: Donation, batch: BatchEscrow, disaster: Disaster) -> dict:
+    # Pro-rata share: this donation's contribution to the batch
+    share = donation.amount_drops / batch.total_amount_drops if batch.total_amount_drops > 0 else 0
     return {
-        "donor_address": donor_address,
-        "total_donations": len(tracked_donations),
-        "donations": tracked_donations,
+        "disaster_id": disaster.disaster_id,
+        "disaster_type": disaster.disaster_type,
+        "location": disaster.location,
+        "severity": disaster.severity,
+        "total_allocated_xrp": from_drops(disaster.total_allocated_drops),
+        "your_share_xrp": from_drops(int(disaster.total_allocated_drops * share)),
+        "your_share_pct": round(share * 100, 2),
+        "status": disaster.status,
+        "created_at": disaster.created_at.isoformat(),
+        "organizations": [],
     }
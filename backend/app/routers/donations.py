@@ -1,13 +1,19 @@
+import asyncio
 import time
 import logging
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from xrpl.models.amounts import IssuedCurrencyAmount
-from app.database import get_db
+from app.database import get_db, read_db, recent_writes
 from app.config import settings
 from app.models.donation import Donation
 from app.services.xrpl_client import xrpl_client
+from app.services.batch_manager import batch_manager
+from app.utils.metrics import metrics
+from app.utils.pagination import PageParams, paginate
+from app.utils.query_budget import query_budget
 from app.utils.ripple_time import to_drops, from_drops, str_to_hex, json_to_hex
 
 logger = logging.getLogger(__name__)
@@ -31,16 +37,73 @@ class ConfirmRequest(BaseModel):
     donor_address: str
 
 
+async def _fetch_account_sequence(donor_address: str) -> int:
+    account_info = await xrpl_client.get_account_info(donor_address)
+    return account_info["account_data"]["Sequence"]
+
+
+async def _fetch_ledger_index() -> int:
+    server_info = await xrpl_client.get_server_info()
+    return server_info["info"]["validated_ledger"]["seq"]
+
+
+async def _gather_prepare_inputs(donor_address: str):
+    """
+    Look up the donor's Sequence, the validated ledger index and the fee concurrently.
+    The ledger index comes straight from the ledger stream when it is connected and the
+    fee is cached per ledger, so usually only account_info goes over the wire. The fee
+    lookup runs alongside it, so waiting for it costs next to nothing.
+    """
+    sequence_task = asyncio.create_task(_fetch_account_sequence(donor_address))
+    fee_task = asyncio.create_task(xrpl_client.get_recommended_fee())
+    ledger_index = xrpl_client.stream.validated_ledger_index if xrpl_client.stream.is_connected() else None
+    ledger_task = None if ledger_index else asyncio.create_task(_fetch_ledger_index())
+    required = [t for t in (sequence_task, fee_task, ledger_task) if t is not None]
+
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*required, return_exceptions=True),
+            timeout=settings.PREPARE_DEADLINE_MS / 1000,
+        )
+    except asyncio.TimeoutError:
+        metrics.increment("donations.prepare.deadline_exceeded")
+        raise HTTPException(status_code=504, detail="XRPL node did not respond in time, please retry")
+
+    if fee_task.exception() is None:
+        fee = fee_task.result()
+    elif xrpl_client.last_fee is not None:
+        # A stale fee beats a guessed one: at peak the base fee gets rejected.
+        fee = xrpl_client.last_fee
+        metrics.increment("donations.prepare.fee_fallback")
+    else:
+        logger.error(f"Failed to get fee: {fee_task.exception()}")
+        raise HTTPException(status_code=400, detail=f"Could not fetch fee: {fee_task.exception()}")
+
+    if ledger_task is not None:
+        try:
+            ledger_index = ledger_task.result()
+        except Exception as e:
+            logger.error(f"Failed to get server info: {e}")
+            raise HTTPException(status_code=400, detail=f"Could not fetch server info: {e}")
+
+    return sequence_task, ledger_index, fee
+
+
 @router.post("/prepare")
 async def prepare_donation(req: PrepareRequest):
+    with metrics.timed("donations.prepare", settings.PREPARE_LATENCY_BUDGET_MS):
+        return await _prepare_donation(req)
+
+
+async def _prepare_donation(req: PrepareRequest):
     donation_id = f"don_{int(time.time() * 1000)}"
     amount_drops = to_drops(req.amount_xrp)
 
     # Fetch account info to autofill the tx so Crossmark doesn't need RPC calls.
     # If account doesn't exist on Devnet, fund it via faucet first.
+    sequence_task, ledger_index, fee = await _gather_prepare_inputs(req.donor_address)
     try:
-        account_info = await xrpl_client.get_account_info(req.donor_address)
-        sequence = account_info["account_data"]["Sequence"]
+        sequence = sequence_task.result()
     except Exception as e:
         if "actNotFound" in str(e):
             logger.info(f"Account {req.donor_address} not found on Devnet, funding via faucet...")
@@ -53,26 +116,13 @@ async def prepare_donation(req: PrepareRequest):
                 )
             # Retry after funding
             try:
-                account_info = await xrpl_client.get_account_info(req.donor_address)
-                sequence = account_info["account_data"]["Sequence"]
+                sequence = await _fetch_account_sequence(req.donor_address)
             except Exception as e2:
                 raise HTTPException(status_code=400, detail=f"Account funded but still not found: {e2}")
         else:
             logger.error(f"Failed to get account info for {req.donor_address}: {e}")
             raise HTTPException(status_code=400, detail=f"Could not fetch account info: {e}")
 
-    try:
-        server_info = await xrpl_client.get_server_info()
-        ledger_index = server_info["info"]["validated_ledger"]["seq"]
-    except Exception as e:
-        logger.error(f"Failed to get server info: {e}")
-        raise HTTPException(status_code=400, detail=f"Could not fetch server info: {e}")
-
-    try:
-        fee = await xrpl_client.get_recommended_fee()
-    except Exception:
-        fee = "12"
-
     # Build Amount field based on currency
     if req.currency == "RLUSD":
         if not settings.RLUSD_ISSUER_ADDRESS:
@@ -112,7 +162,7 @@ async def prepare_donation(req: PrepareRequest):
 
 
 @router.post("/submit")
-async def submit_signed_donation(req: SubmitSignedRequest, db: Session = Depends(get_db)):
+async def submit_signed_donation(req: SubmitSignedRequest, db: AsyncSession = Depends(get_db)):
     """Accept a signed tx blob from the frontend, submit to XRPL, and confirm."""
     try:
         result = await xrpl_client.submit_signed_tx(req.tx_blob)
@@ -149,8 +199,10 @@ async def submit_signed_donation(req: SubmitSignedRequest, db: Session = Depends
         batch_status=batch_status,
     )
     db.add(donation)
-    db.commit()
-    db.refresh(donation)
+    await db.commit()
+    await db.refresh(donation)
+    recent_writes.mark(donation.donor_address)
+    batch_manager.notify_donation(donation.amount_drops, donation.currency)
 
     pool_balance_drops = 0
     try:
@@ -170,14 +222,16 @@ async def submit_signed_donation(req: SubmitSignedRequest, db: Session = Depends
         },
         "pool_status": {
             "current_balance_xrp": from_drops(pool_balance_drops),
-            "threshold_xrp": settings.BATCH_THRESHOLD_XRP,
+            "threshold_xrp": from_drops(batch_manager.decision.threshold_drops),
         },
     }
 
 
 @router.post("/confirm")
-async def confirm_donation(req: ConfirmRequest, db: Session = Depends(get_db)):
-    existing = db.query(Donation).filter_by(payment_tx_hash=req.tx_hash).first()
+async def confirm_donation(req: ConfirmRequest, db: AsyncSession = Depends(get_db)):
+    existing = (await db.execute(
+        select(Donation).filter_by(payment_tx_hash=req.tx_hash)
+    )).scalars().first()
     if existing:
         return {
             "status": "already_confirmed",
@@ -220,8 +274,10 @@ async def confirm_donation(req: ConfirmRequest, db: Session = Depends(get_db)):
         batch_status=batch_status,
     )
     db.add(donation)
-    db.commit()
-    db.refresh(donation)
+    await db.commit()
+    await db.refresh(donation)
+    recent_writes.mark(donation.donor_address)
+    batch_manager.notify_donation(donation.amount_drops, donation.currency)
 
     pool_balance_drops = 0
     try:
@@ -239,20 +295,21 @@ async def confirm_donation(req: ConfirmRequest, db: Session = Depends(get_db)):
         },
         "pool_status": {
             "current_balance_xrp": from_drops(pool_balance_drops),
-            "threshold_xrp": settings.BATCH_THRESHOLD_XRP,
+            "threshold_xrp": from_drops(batch_manager.decision.threshold_drops),
         },
     }
 
 
 @router.get("/status/{address}")
-async def get_donor_status(address: str, db: Session = Depends(get_db)):
-    donations = (
-        db.query(Donation)
-        .filter_by(donor_address=address)
-        .order_by(Donation.created_at.desc())
-        .all()
+@query_budget(2)
+async def get_donor_status(address: str, page: PageParams = Depends(),
+                           db: AsyncSession = Depends(read_db("address"))):
+    donations, next_cursor = await paginate(
+        db, select(Donation).filter_by(donor_address=address), Donation.created_at, Donation.id, page,
+    )
+    total_drops = await db.scalar(
+        select(func.coalesce(func.sum(Donation.amount_drops), 0)).filter_by(donor_address=address)
     )
-    total_drops = sum(d.amount_drops for d in donations)
 
     return {
         "total_donated_xrp": from_drops(total_drops),
@@ -268,4 +325,5 @@ async def get_donor_status(address: str, db: Session = Depends(get_db)):
             }
             for d in donations
         ],
+        "next_cursor": next_cursor,
     }
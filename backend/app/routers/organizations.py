@@ -1,15 +1,21 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import read_db
 from app.models.organization import Organization
+from app.utils.pagination import PageParams, paginate
+from app.utils.query_budget import query_budget
 from app.utils.ripple_time import from_drops
 
 router = APIRouter(prefix="/api/organizations", tags=["organizations"])
 
 
 @router.get("")
-async def list_organizations(db: Session = Depends(get_db)):
-    orgs = db.query(Organization).order_by(Organization.org_id).all()
+@query_budget(1)
+async def list_organizations(page: PageParams = Depends(), db: AsyncSession = Depends(read_db())):
+    orgs, next_cursor = await paginate(
+        db, select(Organization), Organization.created_at, Organization.org_id, page, descending=False,
+    )
     return {
         "organizations": [
             {
@@ -21,5 +27,6 @@ async def list_organizations(db: Session = Depends(get_db)):
                 "total_received_xrp": from_drops(o.total_received_drops),
             }
             for o in orgs
-        ]
+        ],
+        "next_cursor": next_cursor,
     }
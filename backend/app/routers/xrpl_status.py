@@ -39,7 +39,8 @@ async def get_xrpl_status():
 
     return {
         "network": settings.XRPL_NETWORK,
-        "node_url": settings.XRPL_NODE_URL,
+        "node_url": xrpl_client.nodes.submit_node.url,
+        "nodes": xrpl_client.nodes.status(),
         "rlusd_configured": bool(settings.RLUSD_ISSUER_ADDRESS),
         "accounts": {
             "pool": {
@@ -2,13 +2,18 @@ import asyncio
 import time
 import logging
 from datetime import datetime, timezone
+from typing import Optional
 from xrpl.models.transactions import Memo
 from xrpl.models.amounts import IssuedCurrencyAmount
+from sqlalchemy import func, select, tuple_, update
 from app.config import settings
 from app.database import SessionLocal
 from app.models.donation import Donation
 from app.models.batch_escrow import BatchEscrow
-from app.services.xrpl_client import xrpl_client
+from app.services.xrpl_client import xrpl_client, escrow_sequence
+from app.services.batching_policy import make_batching_policy
+from app.services.escrow_scheduler import escrow_scheduler
+from app.utils.metrics import metrics
 from app.utils.ripple_time import (
     ripple_epoch, to_drops, from_drops, str_to_hex, json_to_hex,
 )
@@ -16,112 +21,375 @@ from app.utils.ripple_time import (
 logger = logging.getLogger(__name__)
 
 BATCH_ESCROW_LOCK_SECONDS = 5  # 5 seconds for testing
+SEAL_RETRY_SECONDS = 5
+# Ledgers close every 3-4 seconds; if we miss a close event, seal anyway after this long.
+LEDGER_CLOSE_FALLBACK_SECONDS = 5
+# A claim's escrow has either validated or passed its LastLedgerSequence (autofill's
+# window plus PIPELINE_LEDGER_WINDOW, a couple of minutes) well within this.
+CLAIM_EXPIRY_SECONDS = 300
 
 
 class BatchManager:
+    """
+    Seals pending XRP donations into batch escrows. Donation write paths call
+    `notify_donation`, so a batch is sealed as soon as the running pending total
+    crosses the threshold, and a timer fires when the time window elapses. The
+    threshold and window come from the batching policy, re-evaluated on every
+    ledger close; with ledger alignment on, window-triggered batches are sealed
+    right after a ledger closes so they get the whole open ledger to get in.
+    A slow reconciliation pass re-reads the pending total from the database in
+    case a notification was missed (e.g. a donation written by another process).
+    """
+
     def __init__(self):
-        self.threshold_drops = to_drops(settings.BATCH_THRESHOLD_XRP)
-        self.time_window = settings.BATCH_TIME_WINDOW_SECONDS
+        self.policy = make_batching_policy()
+        self.decision = self.policy.decide(None, 0)
+        self.reconcile_interval = settings.BATCH_RECONCILE_SECONDS
         self.last_batch_time = time.time()
+        # Running total of pending XRP donations. Only a hint for when to look:
+        # the database is re-checked before anything is sealed.
+        self.pending_drops = 0
+        self._events: asyncio.Queue = asyncio.Queue()
+        xrpl_client.stream.add_listener(self._on_stream_message)
+
+    def notify_donation(self, amount_drops: int, currency: str):
+        """Called after a donation is committed."""
+        if currency == "XRP":
+            # Recorded here rather than when the event is consumed: reconcile drains
+            # the queue, and the rate must still see every arrival.
+            self.policy.record_arrival(amount_drops)
+            self._events.put_nowait(("donation", amount_drops))
+
+    def _on_stream_message(self, message: dict):
+        if message.get("type") == "ledgerClosed":
+            self._events.put_nowait(("ledger", message.get("ledger_index")))
+
+    def _window_deadline(self) -> float:
+        deadline = self.last_batch_time + self.decision.window_seconds
+        if self.decision.align_to_ledger and xrpl_client.stream.is_connected():
+            # The next ledger close does the sealing; the timer is only a fallback.
+            deadline += LEDGER_CLOSE_FALLBACK_SECONDS
+        return deadline
 
     async def run(self):
-        logger.info("Batch Manager started")
+        logger.info(f"Batch Manager started ({self.policy.name} batching policy)")
+        next_reconcile = 0
         while True:
             try:
+                now = time.time()
+                if now >= next_reconcile:
+                    await self.recover_stale_claims()
+                    await self.reconcile()
+                    await self.refresh_policy()
+                    next_reconcile = now + self.reconcile_interval
+
+                timeout = next_reconcile - now
+                if self.pending_drops > 0:
+                    timeout = min(timeout, self._window_deadline() - now)
+
+                try:
+                    kind, value = await asyncio.wait_for(self._events.get(), max(timeout, 0))
+                    if kind == "donation":
+                        self.pending_drops += value
+                        if self.pending_drops < self.decision.threshold_drops:
+                            continue
+                    else:
+                        await self.refresh_policy()
+                        window_elapsed = time.time() - self.last_batch_time >= self.decision.window_seconds
+                        if not (self.pending_drops > 0 and window_elapsed):
+                            continue
+                except asyncio.TimeoutError:
+                    pass
+
                 await self.check_triggers()
+                await self.reconcile()
             except Exception as e:
                 logger.error(f"Batch Manager error: {e}")
-            await asyncio.sleep(30)
+                await asyncio.sleep(SEAL_RETRY_SECONDS)
+
+    async def refresh_policy(self):
+        """Re-run the batching policy with the current fee and number of unfinished batch escrows."""
+        try:
+            fee_drops = int(await xrpl_client.get_recommended_fee())
+        except Exception:
+            fee_drops = None
+        async with SessionLocal() as db:
+            in_flight = await db.scalar(
+                select(func.count(BatchEscrow.batch_id)).filter_by(status="locked")
+            )
+        self.decision = self.policy.decide(fee_drops, in_flight)
+
+    async def reconcile(self):
+        """Reset the running total from the database."""
+        # Queued notifications are covered by the query below.
+        while not self._events.empty():
+            self._events.get_nowait()
+        async with SessionLocal() as db:
+            total = await db.scalar(
+                select(func.coalesce(func.sum(Donation.amount_drops), 0))
+                .filter_by(batch_status="pending", currency="XRP")
+            )
+        self.pending_drops = int(total)
 
-    async def check_triggers(self):
+    async def check_triggers(self) -> bool:
+        """Seal a batch if either trigger has fired. Returns True if one was sealed."""
         db = SessionLocal()
         try:
             # Only batch XRP donations. RLUSD stays in pool for direct emergency distribution.
-            pending = db.query(Donation).filter_by(batch_status="pending", currency="XRP").all()
-            if not pending:
-                return
+            count, total_pending_drops = (await db.execute(
+                select(func.count(Donation.id), func.coalesce(func.sum(Donation.amount_drops), 0))
+                .filter_by(batch_status="pending", currency="XRP")
+            )).one()
+            if not count:
+                return False
 
-            total_pending_drops = sum(d.amount_drops for d in pending)
             time_since_batch = time.time() - self.last_batch_time
 
-            if total_pending_drops >= self.threshold_drops:
-                logger.info(f"Threshold trigger: {from_drops(total_pending_drops)} >= {settings.BATCH_THRESHOLD_XRP}")
-                await self.create_batch(db, pending, "threshold", "XRP")
-            elif time_since_batch >= self.time_window and total_pending_drops > 0:
-                logger.info(f"Time trigger: {time_since_batch:.0f}s >= {self.time_window}s")
-                await self.create_batch(db, pending, "time", "XRP")
+            threshold_drops = self.decision.threshold_drops
+            window = self.decision.window_seconds
+            if total_pending_drops >= threshold_drops:
+                logger.info(f"Threshold trigger: {from_drops(total_pending_drops)} >= {from_drops(threshold_drops)}")
+                return await self.create_batch(db, "threshold", "XRP")
+            elif time_since_batch >= window and total_pending_drops > 0:
+                logger.info(f"Time trigger: {time_since_batch:.1f}s >= {window:.1f}s")
+                return await self.create_batch(db, "time", "XRP")
+            return False
         finally:
-            db.close()
-
-    async def create_batch(self, db, donations, trigger: str, currency: str):
-        total_drops = sum(d.amount_drops for d in donations)
-        batch_id = f"batch_{currency.lower()}_{int(time.time())}"
-        now = int(time.time())
-        finish_after = ripple_epoch(now + BATCH_ESCROW_LOCK_SECONDS)
+            await db.close()
 
-        memos = [
-            Memo(
-                memo_type=str_to_hex("batch_escrow"),
-                memo_data=json_to_hex({
-                    "batch_id": batch_id,
-                    "trigger": trigger,
-                    "currency": currency,
-                    "donor_count": len(donations),
-                    "total": from_drops(total_drops),
-                    "created_at": datetime.now(timezone.utc).isoformat(),
-                }),
+    async def plan_chunks(self, db, currency: str, cutoff: datetime) -> list[tuple]:
+        """
+        Split the pending backlog up to `cutoff` into consecutive (created_at, id) ranges
+        that each fit within BATCH_MAX_ESCROW_XRP and BATCH_MAX_DONORS. Rows are streamed,
+        so only the range boundaries are kept in memory. A single donation over the cap
+        gets an escrow of its own.
+        """
+        max_drops = to_drops(settings.BATCH_MAX_ESCROW_XRP)
+        max_donors = settings.BATCH_MAX_DONORS
+        rows = await db.stream(
+            select(Donation.created_at, Donation.id, Donation.amount_drops)
+            .where(
+                Donation.batch_status == "pending",
+                Donation.currency == currency,
+                Donation.created_at <= cutoff,
             )
+            .order_by(Donation.created_at, Donation.id)
+            .execution_options(yield_per=1000)
+        )
+        boundaries = []
+        count = total = 0
+        last = None
+        async for created_at, donation_id, amount_drops in rows:
+            if count and (count >= max_donors or total + amount_drops > max_drops):
+                boundaries.append(last)
+                count = total = 0
+            count += 1
+            total += amount_drops
+            last = (created_at, donation_id)
+        if count:
+            boundaries.append(last)
+        return boundaries
+
+    async def claim_range(self, db, batch_id: str, currency: str, after: Optional[tuple], upto: tuple) -> tuple[int, int]:
+        """
+        Move the pending donations in the (created_at, id) range (after, upto] into
+        `sealing` under `batch_id` with one UPDATE ... RETURNING, and return
+        (count, total drops).
+        """
+        position = tuple_(Donation.created_at, Donation.id)
+        conditions = [
+            Donation.batch_status == "pending",
+            Donation.currency == currency,
+            position <= tuple_(*upto),
         ]
+        if after is not None:
+            conditions.append(position > tuple_(*after))
+        claimed = (
+            update(Donation)
+            .where(*conditions)
+            .values(batch_status="sealing", batch_id=batch_id)
+            .returning(Donation.amount_drops)
+            .cte("claimed")
+        )
+        count, total = (await db.execute(
+            select(func.count(), func.coalesce(func.sum(claimed.c.amount_drops), 0))
+        )).one()
+        return count, int(total)
 
-        # Build the escrow amount based on currency
-        if currency == "RLUSD":
-            escrow_amount = IssuedCurrencyAmount(
-                currency=settings.RLUSD_CURRENCY_HEX,
-                issuer=settings.RLUSD_ISSUER_ADDRESS,
-                value=str(from_drops(total_drops)),
+    async def settle_claim(self, db, batch_id: str, batch_status: str):
+        """Move a batch's claimed donations out of `sealing`: locked on success, back to pending on failure."""
+        await db.execute(
+            update(Donation)
+            .where(Donation.batch_id == batch_id, Donation.batch_status == "sealing")
+            .values(
+                batch_status=batch_status,
+                batch_id=batch_id if batch_status != "pending" else None,
             )
-        else:
-            escrow_amount = str(total_drops)
+        )
+
+    async def recover_stale_claims(self):
+        """
+        Donations left in `sealing` by a worker that crashed between claiming them and
+        committing the batch. Claims younger than CLAIM_EXPIRY_SECONDS may belong to a
+        worker that is sealing right now, so they are left alone. Older ones are looked
+        up on-ledger by their batch memo: an escrow that validated is recorded as if the
+        seal had committed; with no escrow the claim can no longer validate and goes
+        back to pending.
+        """
+        async with SessionLocal() as db:
+            claims = (await db.execute(
+                select(Donation.batch_id, func.count(Donation.id), func.sum(Donation.amount_drops))
+                .where(Donation.batch_status == "sealing")
+                .group_by(Donation.batch_id)
+            )).all()
+            expired_before = time.time() - CLAIM_EXPIRY_SECONDS
+            claimed_at = {}
+            for batch_id, _, _ in claims:
+                try:
+                    claimed_at[batch_id] = _claimed_at(batch_id)
+                except (IndexError, ValueError):
+                    logger.error(f"Cannot tell when batch {batch_id} was claimed; leaving it sealing")
+            claims = [c for c in claims if claimed_at.get(c[0], expired_before) < expired_before]
+            if not claims:
+                return
+
+            since = ripple_epoch(min(claimed_at[c[0]] for c in claims) - 60)
+            try:
+                escrows = {
+                    memo.get("batch_id"): result
+                    for memo, result in await xrpl_client.find_memo_transactions(
+                        xrpl_client.pool_wallet.address, "batch_escrow", since,
+                    )
+                    if result["tx_json"].get("TransactionType") == "EscrowCreate"
+                }
+            except Exception as e:
+                logger.error(f"Cannot check stale claims against the ledger, leaving them sealing: {e}")
+                return
+
+            recovered, released = [], []
+            for batch_id, donor_count, total_drops in claims:
+                result = escrows.get(batch_id)
+                if result is not None:
+                    tx = result["tx_json"]
+                    db.add(BatchEscrow(
+                        batch_id=batch_id,
+                        escrow_tx_hash=result["hash"],
+                        total_amount_drops=int(total_drops),
+                        donor_count=donor_count,
+                        status="locked",
+                        trigger_type="recovered",
+                        finish_after=tx["FinishAfter"],
+                        sequence=escrow_sequence(result),
+                    ))
+                    await self.settle_claim(db, batch_id, "locked_in_escrow")
+                    recovered.append((batch_id, tx["FinishAfter"]))
+                else:
+                    await self.settle_claim(db, batch_id, "pending")
+                    released.append(batch_id)
+            await db.commit()
+
+        for batch_id, finish_after in recovered:
+            escrow_scheduler.schedule("batch", batch_id, finish_after)
+        if recovered:
+            logger.warning(f"Recorded {len(recovered)} batch escrows found on-ledger after an interrupted seal: {[b for b, _ in recovered]}")
+        if released:
+            logger.warning(f"Released {len(released)} expired claims with no escrow on-ledger back to pending: {released}")
+
+    async def create_batch(self, db, trigger: str, currency: str) -> bool:
+        base_id = f"batch_{currency.lower()}_{int(time.time() * 1000)}"
+        now = int(time.time())
+        finish_after = ripple_epoch(now + BATCH_ESCROW_LOCK_SECONDS)
+
+        boundaries = await self.plan_chunks(db, currency, datetime.now(timezone.utc))
+        chunks = []
+        after = None
+        for i, upto in enumerate(boundaries):
+            batch_id = base_id if len(boundaries) == 1 else f"{base_id}_{i}"
+            donor_count, total_drops = await self.claim_range(db, batch_id, currency, after, upto)
+            if donor_count:
+                chunks.append((batch_id, donor_count, total_drops))
+            after = upto
+        await db.commit()
+        if not chunks:
+            return False
+        if len(chunks) > 1:
+            logger.info(f"Splitting {currency} backlog into {len(chunks)} batch escrows")
+
+        escrow_params = []
+        for part, (batch_id, donor_count, total_drops) in enumerate(chunks, start=1):
+            memo = {
+                "batch_id": batch_id,
+                "trigger": trigger,
+                "currency": currency,
+                "donor_count": donor_count,
+                "total": from_drops(total_drops),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            if len(chunks) > 1:
+                memo["part"] = part
+                memo["parts"] = len(chunks)
+
+            # Build the escrow amount based on currency
+            if currency == "RLUSD":
+                escrow_amount = IssuedCurrencyAmount(
+                    currency=settings.RLUSD_CURRENCY_HEX,
+                    issuer=settings.RLUSD_ISSUER_ADDRESS,
+                    value=str(from_drops(total_drops)),
+                )
+            else:
+                escrow_amount = total_drops
+
+            escrow_params.append({
+                "destination": settings.RESERVE_WALLET_ADDRESS,
+                "amount_drops": escrow_amount,
+                "finish_after": finish_after,
+                "memos": [Memo(memo_type=str_to_hex("batch_escrow"), memo_data=json_to_hex(memo))],
+            })
 
         try:
-            result = await xrpl_client.create_escrow(
-                wallet=xrpl_client.pool_wallet,
-                destination=settings.RESERVE_WALLET_ADDRESS,
-                amount_drops=escrow_amount,
-                finish_after=finish_after,
-                memos=memos,
-            )
+            results = await xrpl_client.create_escrows_batch(xrpl_client.pool_wallet, escrow_params)
+        except Exception as e:
+            results = [{"error": str(e)}] * len(chunks)
 
-            tx_hash = result.get("hash", "")
-            sequence = result.get("Sequence") or result.get("tx_json", {}).get("Sequence", 0)
+        created = 0
+        for (batch_id, donor_count, total_drops), result in zip(chunks, results):
+            if "error" in result:
+                logger.error(f"Failed to create {currency} batch escrow {batch_id}: {result['error']}")
+                await self.settle_claim(db, batch_id, "pending")
+                continue
 
-            batch_escrow = BatchEscrow(
+            tx_hash = result.get("hash", "")
+            db.add(BatchEscrow(
                 batch_id=batch_id,
                 escrow_tx_hash=tx_hash,
                 total_amount_drops=total_drops,
-                donor_count=len(donations),
+                donor_count=donor_count,
                 status="locked",
                 trigger_type=trigger,
                 finish_after=finish_after,
-                sequence=sequence,
-            )
-            db.add(batch_escrow)
-
-            for d in donations:
-                d.batch_id = batch_id
-                d.batch_status = "locked_in_escrow"
-
-            db.commit()
-            self.last_batch_time[currency] = time.time()
-
+                sequence=escrow_sequence(result),
+            ))
+            await self.settle_claim(db, batch_id, "locked_in_escrow")
+            created += 1
+            metrics.increment(f"batching.sealed.{trigger}")
             logger.info(
                 f"Batch {batch_id} created: {from_drops(total_drops)} {currency} "
-                f"from {len(donations)} donors | tx: {tx_hash}"
+                f"from {donor_count} donors | tx: {tx_hash}"
             )
+        await db.commit()
+        for (batch_id, _, _), result in zip(chunks, results):
+            if "error" not in result:
+                escrow_scheduler.schedule("batch", batch_id, finish_after)
 
-        except Exception as e:
-            logger.error(f"Failed to create {currency} batch escrow: {e}")
-            db.rollback()
+        if not created:
+            raise Exception(f"All {len(chunks)} {currency} batch escrows failed")
+        self.last_batch_time = time.time()
+        return True
+
+
+def _claimed_at(batch_id: str) -> float:
+    """Unix time a batch was claimed, from the millisecond stamp in its id (batch_<currency>_<ms>[_<part>])."""
+    return int(batch_id.split("_")[2]) / 1000
 
 
 batch_manager = BatchManager()
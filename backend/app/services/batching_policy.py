@@ -0,0 +1,130 @@
+import math
+import time
+from typing import Optional
+from app.config import settings
+from app.utils.metrics import metrics
+from app.utils.ripple_time import to_drops, from_drops
+
+# Reference transaction cost. Open-ledger fees above this mean the ledger is busy.
+BASE_FEE_DROPS = 10
+# Time constant of the arrival rate estimate: older donations fade out over about a minute.
+ARRIVAL_RATE_TAU_SECONDS = 60
+
+
+class BatchingDecision:
+    def __init__(self, threshold_drops: int, window_seconds: float, align_to_ledger: bool, reason: str):
+        self.threshold_drops = threshold_drops
+        self.window_seconds = window_seconds
+        self.align_to_ledger = align_to_ledger
+        self.reason = reason
+
+
+class StaticBatchingPolicy:
+    """The fixed BATCH_THRESHOLD_XRP / BATCH_TIME_WINDOW_SECONDS behaviour."""
+
+    name = "static"
+
+    def __init__(self, threshold_drops: int, window_seconds: float, align_to_ledger: bool = False):
+        self.threshold_drops = threshold_drops
+        self.window_seconds = window_seconds
+        self.align_to_ledger = align_to_ledger
+
+    def record_arrival(self, amount_drops: int):
+        pass
+
+    def decide(self, fee_drops: Optional[int], escrows_in_flight: int) -> BatchingDecision:
+        return self._publish(BatchingDecision(
+            self.threshold_drops, self.window_seconds, self.align_to_ledger, "static"
+        ))
+
+    def _publish(self, decision: BatchingDecision) -> BatchingDecision:
+        metrics.set_gauge("batching.threshold_xrp", from_drops(decision.threshold_drops))
+        metrics.set_gauge("batching.window_seconds", decision.window_seconds)
+        metrics.increment(f"batching.decisions.{decision.reason}")
+        return decision
+
+
+class AdaptiveBatchingPolicy(StaticBatchingPolicy):
+    """
+    Starts from the static threshold and window and grows them under load:
+
+    - arrival rate: the threshold rises so that, at the current rate, batches seal
+      no more often than `target_seals_per_minute`;
+    - open-ledger fee: the window stretches by the fee escalation over the base fee,
+      so small batches wait out a busy ledger instead of paying for it;
+    - escrows in flight: past `max_escrows_in_flight` unfinished batch escrows, both
+      scale up proportionally so the pool wallet isn't flooded.
+
+    When it is quiet none of these apply and batches seal on the static settings.
+    """
+
+    name = "adaptive"
+
+    def __init__(self, threshold_drops: int, window_seconds: float, max_threshold_drops: int,
+                 max_window_seconds: float, target_seals_per_minute: float,
+                 max_escrows_in_flight: int, align_to_ledger: bool = True):
+        super().__init__(threshold_drops, window_seconds, align_to_ledger)
+        self.max_threshold_drops = max(max_threshold_drops, threshold_drops)
+        self.max_window_seconds = max(max_window_seconds, window_seconds)
+        self.target_seals_per_minute = target_seals_per_minute
+        self.max_escrows_in_flight = max_escrows_in_flight
+        self._rate = 0.0  # drops per second
+        self._rate_updated = time.monotonic()
+
+    def arrival_rate(self) -> float:
+        """Exponentially weighted donation inflow in drops per second."""
+        now = time.monotonic()
+        self._rate *= math.exp(-(now - self._rate_updated) / ARRIVAL_RATE_TAU_SECONDS)
+        self._rate_updated = now
+        return self._rate
+
+    def record_arrival(self, amount_drops: int):
+        self._rate = self.arrival_rate() + amount_drops / ARRIVAL_RATE_TAU_SECONDS
+
+    def decide(self, fee_drops: Optional[int], escrows_in_flight: int) -> BatchingDecision:
+        rate = self.arrival_rate()
+        reasons = []
+
+        threshold = self.threshold_drops
+        rate_threshold = rate * 60 / self.target_seals_per_minute
+        if rate_threshold > threshold:
+            threshold = rate_threshold
+            reasons.append("rate")
+
+        window = self.window_seconds
+        if fee_drops and fee_drops > BASE_FEE_DROPS:
+            window *= fee_drops / BASE_FEE_DROPS
+            reasons.append("fee")
+
+        if escrows_in_flight > self.max_escrows_in_flight:
+            backlog = escrows_in_flight / self.max_escrows_in_flight
+            threshold *= backlog
+            window *= backlog
+            reasons.append("in_flight")
+
+        metrics.set_gauge("batching.arrival_rate_xrp_per_s", round(from_drops(rate), 6))
+        metrics.set_gauge("batching.fee_drops", fee_drops or 0)
+        metrics.set_gauge("batching.escrows_in_flight", escrows_in_flight)
+        return self._publish(BatchingDecision(
+            int(min(threshold, self.max_threshold_drops)),
+            min(window, self.max_window_seconds),
+            self.align_to_ledger,
+            "_".join(reasons) or "quiet",
+        ))
+
+
+def make_batching_policy() -> StaticBatchingPolicy:
+    threshold_drops = to_drops(settings.BATCH_THRESHOLD_XRP)
+    if settings.BATCH_POLICY == "static":
+        return StaticBatchingPolicy(threshold_drops, settings.BATCH_TIME_WINDOW_SECONDS)
+    if settings.BATCH_POLICY != "adaptive":
+        raise ValueError(f"Unknown BATCH_POLICY: {settings.BATCH_POLICY}")
+    return AdaptiveBatchingPolicy(
+        threshold_drops,
+        settings.BATCH_TIME_WINDOW_SECONDS,
+        max_threshold_drops=to_drops(settings.BATCH_MAX_THRESHOLD_XRP),
+        max_window_seconds=settings.BATCH_MAX_WINDOW_SECONDS,
+        target_seals_per_minute=settings.BATCH_TARGET_SEALS_PER_MINUTE,
+        max_escrows_in_flight=settings.BATCH_MAX_ESCROWS_IN_FLIGHT,
+        align_to_ledger=settings.BATCH_ALIGN_TO_LEDGER,
+    )
@@ -0,0 +1,16 @@
+from typing import Set
+from fastapi import WebSocket
+
+# WebSocket connections
+ws_connections: Set[WebSocket] = set()
+
+
+async def broadcast(event: dict):
+    dead = set()
+    # Snapshot: sockets connect and disconnect while we await sends
+    for ws in list(ws_connections):
+        try:
+            await ws.send_json(event)
+        except Exception:
+            dead.add(ws)
+    ws_connections.difference_update(dead)
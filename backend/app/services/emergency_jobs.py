@@ -0,0 +1,573 @@
+import asyncio
+import logging
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import select, update
+from xrpl.wallet import Wallet
+from xrpl.models.transactions import Memo
+from xrpl.models.amounts import IssuedCurrencyAmount
+from app.config import settings
+from app.database import SessionLocal
+from app.models.disaster import Disaster
+from app.models.emergency_job import EmergencyJob
+from app.models.organization import Organization
+from app.models.org_escrow import OrgEscrow
+from app.services.allocation_engine import calculate_allocations
+from app.services.broadcaster import broadcast
+from app.services.escrow_scheduler import escrow_scheduler
+from app.services.lineage import record_lineage
+from app.services.wallet_pool import wallet_pool, activate_wallet
+from app.services.xrpl_client import xrpl_client, escrow_sequence
+from app.utils.crypto import encrypt_seed
+from app.utils.ids import uuid7
+from app.utils.ripple_time import (
+    ripple_epoch, from_drops, to_drops, str_to_hex, json_to_hex,
+)
+
+logger = logging.getLogger(__name__)
+
+ESCROW_LOCK_SECONDS = 30  # Must exceed batch creation time (a few ledger closes with pipelined submission)
+ESCROW_CANCEL_SECONDS = 86400  # 24 hours
+# Running jobs refresh updated_at on this interval; a queued/running job not refreshed
+# within the lease belongs to a process that died.
+JOB_HEARTBEAT_SECONDS = 15
+JOB_LEASE_SECONDS = 60
+
+
+class JobProgress:
+    """
+    Current step and counters of one job, persisted and pushed to /ws clients.
+    Updates are coalesced: while one save is in flight, later updates only mark the
+    state dirty and that save goes round again, so a job holds at most one session
+    however many escrows settle at once.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.step: Optional[str] = None
+        self.progress: dict = {}
+        self.disaster_id: Optional[str] = None
+        self._dirty = False
+        self._saving = False
+
+    async def update(self, step: Optional[str] = None, **progress):
+        if step is not None:
+            self.step = step
+        self.progress.update(progress)
+        self._dirty = True
+        if self._saving:
+            return
+        self._saving = True
+        try:
+            while self._dirty:
+                self._dirty = False
+                await self.save("running")
+        finally:
+            self._saving = False
+
+    async def save(self, status: str, **columns):
+        async with SessionLocal() as db:
+            await db.execute(
+                update(EmergencyJob)
+                .where(EmergencyJob.job_id == self.job_id)
+                .values(status=status, step=self.step, progress=dict(self.progress),
+                        disaster_id=self.disaster_id, updated_at=datetime.now(timezone.utc), **columns)
+            )
+            await db.commit()
+
+        await broadcast({
+            "type": "emergency_job",
+            "job_id": self.job_id,
+            "status": status,
+            "step": self.step,
+            "progress": self.progress,
+            "disaster_id": self.disaster_id,
+        })
+
+
+class EmergencyJobRunner:
+    """
+    Runs emergency triggers in the background. POST /trigger only records the job;
+    clients follow it through GET /api/emergencies/jobs/{job_id} or /ws events.
+    """
+
+    def __init__(self):
+        self._tasks: set[asyncio.Task] = set()
+        self._job_ids: set[str] = set()
+
+    async def submit(self, db, request: dict) -> str:
+        job_id = f"job_{uuid7().hex}"
+        db.add(EmergencyJob(job_id=job_id, status="queued", request=request, progress={}))
+        await db.commit()
+
+        task = asyncio.create_task(self._run(job_id, request))
+        self._tasks.add(task)
+        self._job_ids.add(job_id)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._job_ids.discard(job_id))
+        logger.info(f"Emergency job {job_id} queued ({request['disaster_type']} in {request['location']})")
+        return job_id
+
+    async def _run(self, job_id: str, request: dict):
+        job = JobProgress(job_id)
+        try:
+            result = await run_trigger(request, job)
+        except Exception as e:
+            logger.error(f"Emergency job {job_id} failed at step '{job.step}': {e}")
+            traceback.print_exc()
+            await job.save("failed", error=str(e))
+            return
+        job.step = "done"
+        await job.save("completed", result=result)
+        logger.info(f"Emergency job {job_id} completed ({result['disaster_id']})")
+
+    async def run(self):
+        """Heartbeat this process's jobs and expire those whose owner stopped heartbeating."""
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                await self.heartbeat()
+                await self.mark_interrupted()
+            except Exception as e:
+                logger.error(f"Emergency job heartbeat error: {e}")
+
+    async def heartbeat(self):
+        if not self._job_ids:
+            return
+        async with SessionLocal() as db:
+            await db.execute(
+                update(EmergencyJob)
+                .where(EmergencyJob.job_id.in_(list(self._job_ids)),
+                       EmergencyJob.status.in_(["queued", "running"]))
+                .values(updated_at=datetime.now(timezone.utc))
+            )
+            await db.commit()
+
+    async def mark_interrupted(self):
+        """
+        Jobs still queued or running whose lease ran out died with their process. Jobs
+        other live workers are running keep heartbeating, so they are left alone.
+        """
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=JOB_LEASE_SECONDS)
+        async with SessionLocal() as db:
+            count = (await db.execute(
+                update(EmergencyJob)
+                .where(EmergencyJob.status.in_(["queued", "running"]),
+                       EmergencyJob.updated_at < stale_before)
+                .values(status="interrupted", error="Server stopped while the job was running",
+                        updated_at=datetime.now(timezone.utc))
+            )).rowcount
+            await db.commit()
+        if count:
+            logger.warning(f"Marked {count} emergency job(s) as interrupted")
+
+
+async def run_trigger(req: dict, job: JobProgress) -> dict:
+    allocate_xrp = req["currency"] in ("XRP", "BOTH")
+    allocate_rlusd = req["currency"] in ("RLUSD", "BOTH") and bool(settings.RLUSD_ISSUER_ADDRESS)
+
+    await job.update("allocating")
+    db = SessionLocal()
+    try:
+        orgs = (await db.execute(
+            select(Organization).where(Organization.cause_type.in_(req["affected_causes"]))
+        )).scalars().all()
+        if not orgs:
+            raise Exception("No matching organizations found")
+        org_names = {org.org_id: org.name for org in orgs}
+        await db.commit()  # don't sit idle in a transaction while the ledger is queried
+
+        allocations, fund_amount = [], 0
+        if allocate_xrp:
+            allocations, fund_amount = await _plan_xrp_allocations(orgs, req["severity"])
+
+        # Take a pre-activated disaster wallet from the warm pool
+        await job.update("wallet")
+        disaster_id = f"disaster_{uuid7().hex}"
+        has_trustline = False
+        claimed = await wallet_pool.claim(db, need_trustline=allocate_rlusd)
+        if claimed:
+            disaster_wallet, has_trustline = claimed
+            logger.info(f"Claimed warm disaster wallet {disaster_wallet.address}")
+        else:
+            # Pool is empty: create one and fund it via faucet + wait for on-ledger existence
+            logger.warning("Warm wallet pool empty, activating a disaster wallet on demand")
+            disaster_wallet = Wallet.create()
+            if not await activate_wallet(disaster_wallet):
+                raise Exception("Disaster wallet failed to activate on-ledger after faucet funding")
+
+        # Until the Disaster row commits, nothing references the wallet: hand it back
+        # to the warm pool if we fail before then, rather than lose a funded wallet.
+        trustline_ok = has_trustline
+        try:
+            await job.update("funding")
+            total_allocation = sum(a["amount_drops"] for a in allocations)
+            trustline = None
+            if allocate_rlusd and not has_trustline:
+                trustline = asyncio.create_task(_set_trustline(disaster_wallet, disaster_id))
+            try:
+                if allocate_xrp and fund_amount > 0:
+                    logger.info(f"Funding disaster wallet: {from_drops(total_allocation)} XRP allocation + {from_drops(fund_amount - total_allocation)} XRP overhead = {from_drops(fund_amount)} XRP total")
+                    try:
+                        await xrpl_client.submit_payment(
+                            wallet=xrpl_client.reserve_wallet,
+                            destination=disaster_wallet.address,
+                            amount_drops=fund_amount,
+                        )
+                        logger.info(f"Funded disaster account {disaster_id}: {fund_amount} drops")
+                    except Exception as e:
+                        raise Exception(f"Failed to fund disaster account: {e}")
+            finally:
+                trustline_ok = await trustline if trustline else allocate_rlusd
+            if allocate_rlusd and not trustline_ok:
+                logger.error("Cannot proceed with RLUSD allocation — TrustLine setup failed")
+
+            disaster = Disaster(
+                disaster_id=disaster_id,
+                wallet_address=disaster_wallet.address,
+                wallet_seed_encrypted=encrypt_seed(disaster_wallet.seed),
+                disaster_type=req["disaster_type"],
+                location=req["location"],
+                severity=req["severity"],
+                total_allocated_drops=total_allocation,
+                status="active",
+            )
+            db.add(disaster)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            await wallet_pool.release(disaster_wallet, has_trustline=has_trustline or bool(trustline_ok))
+            raise
+        job.disaster_id = disaster_id
+        await job.update("escrows")
+    finally:
+        await db.close()
+
+    now = int(time.time())
+    finish_after = ripple_epoch(now + ESCROW_LOCK_SECONDS)
+    cancel_after = ripple_epoch(now + ESCROW_CANCEL_SECONDS)
+
+    # The XRP and RLUSD escrows share the disaster wallet's sequence reservation,
+    # so both pipelines can be in flight at once.
+    pipelines = []
+    if allocate_xrp:
+        pipelines.append(_create_xrp_escrows(
+            req, job, disaster_id, disaster_wallet, allocations, org_names, finish_after, cancel_after,
+        ))
+    if allocate_rlusd and trustline_ok:
+        pipelines.append(_create_rlusd_escrows(
+            req, job, disaster_id, disaster_wallet, orgs, org_names, finish_after, cancel_after,
+        ))
+    outcomes = await asyncio.gather(*pipelines)
+
+    result = {
+        "disaster_id": disaster_id,
+        "disaster_account": disaster_wallet.address,
+        "total_allocated_xrp": 0.0,
+        "total_allocated_rlusd": 0.0,
+        "allocations": [],
+        "rlusd_allocations": [],
+    }
+    for outcome in outcomes:
+        result.update(outcome)
+    return result
+
+
+async def _plan_xrp_allocations(orgs: list, severity: int) -> tuple[list[dict], int]:
+    """Split what the reserve can spare across `orgs`. Returns the allocations and the amount to fund."""
+    num_orgs = len(orgs)
+    try:
+        reserve_info = await xrpl_client.get_account_info(settings.RESERVE_WALLET_ADDRESS)
+        reserve_balance = int(reserve_info["account_data"]["Balance"])
+    except Exception as e:
+        raise Exception(f"Cannot read reserve balance: {e}")
+
+    available_to_send = reserve_balance - to_drops(10)  # Reserve must keep 10 XRP minimum
+
+    # Calculate all costs that disaster wallet needs
+    disaster_reserve = to_drops(1.5)       # Disaster wallet base reserve + buffer
+    owner_reserve = num_orgs * to_drops(0.2)  # XRPL owner reserve per escrow object
+    escrow_create_fees = num_orgs * to_drops(0.02)  # Fee per EscrowCreate tx
+    escrow_finish_fees = num_orgs * to_drops(0.02)  # Fee per EscrowFinish tx
+    if xrpl_client.finisher_wallet:
+        escrow_finish_fees = 0  # Finisher wallet pays for EscrowFinish
+    disaster_buffer = to_drops(0.5)        # Safety margin
+    funding_fee = to_drops(0.02)           # Fee for reserve→disaster payment
+
+    total_overhead = disaster_reserve + owner_reserve + escrow_create_fees + escrow_finish_fees + disaster_buffer + funding_fee
+    available_for_allocation = available_to_send - total_overhead
+
+    if available_for_allocation <= 0:
+        min_needed = to_drops(10 + 1.5 + 0.5 + 0.1)
+        raise Exception(f"Insufficient reserve balance. Need at least {from_drops(min_needed)} XRP in reserve to trigger emergency.")
+
+    logger.info(f"Reserve balance: {from_drops(reserve_balance)} XRP, Available to send: {from_drops(available_to_send)} XRP, Available for allocation: {from_drops(available_for_allocation)} XRP")
+
+    allocations = calculate_allocations(orgs, available_for_allocation, severity)
+
+    # Safety check
+    total_requested = sum(a["amount_drops"] for a in allocations)
+    if total_requested > available_for_allocation:
+        logger.warning(f"Allocations ({from_drops(total_requested)} XRP) exceed available ({from_drops(available_for_allocation)} XRP). Scaling down.")
+        scale_factor = available_for_allocation / total_requested
+        for alloc in allocations:
+            alloc["amount_drops"] = int(alloc["amount_drops"] * scale_factor)
+            alloc["percentage"] = alloc["percentage"] * scale_factor
+
+    total_allocation = sum(a["amount_drops"] for a in allocations)
+    fund_amount = total_allocation + disaster_reserve + owner_reserve + escrow_create_fees + escrow_finish_fees + disaster_buffer
+    return allocations, fund_amount
+
+
+async def _set_trustline(wallet: Wallet, disaster_id: str) -> bool:
+    """RLUSD TrustLine on the disaster wallet (required for TokenEscrow)."""
+    try:
+        resp = await xrpl_client.set_rlusd_trustline(wallet)
+        tx_result = resp.get("meta", {}).get("TransactionResult", "")
+        if tx_result == "tesSUCCESS":
+            logger.info(f"RLUSD TrustLine set on disaster wallet {disaster_id}")
+            return True
+        logger.error(f"TrustLine tx failed: {tx_result}")
+    except Exception as e:
+        logger.error(f"Failed to set RLUSD TrustLine on disaster wallet: {e}")
+        traceback.print_exc()
+    return False
+
+
+def _progress_reporter(job: JobProgress, key: str, total: int):
+    """on_result callback that publishes "<key>: {done, failed, total}" as escrows settle."""
+    counts = {"done": 0, "failed": 0, "total": total}
+
+    async def on_result(index: int, result: dict):
+        counts["failed" if "error" in result else "done"] += 1
+        await job.update(**{key: dict(counts)})
+
+    return on_result
+
+
+async def _create_xrp_escrows(req: dict, job: JobProgress, disaster_id: str, disaster_wallet: Wallet,
+                              allocations: list[dict], org_names: dict[int, str],
+                              finish_after: int, cancel_after: int) -> dict:
+    escrow_results = []
+    successful_escrows = 0
+    failed_escrows = 0
+    actual_allocated_drops = 0
+
+    batch_params = []
+    for alloc in allocations:
+        memos = [
+            Memo(
+                memo_type=str_to_hex("allocation"),
+                memo_data=json_to_hex({
+                    "disaster_id": disaster_id,
+                    "org_id": alloc["org_id"],
+                    "disaster_type": req["disaster_type"],
+                }),
+            )
+        ]
+        batch_params.append({
+            "destination": alloc["org_address"],
+            "amount_drops": alloc["amount_drops"],
+            "finish_after": finish_after,
+            "cancel_after": cancel_after,
+            "memos": memos,
+        })
+
+    # Single pipelined call — one connection, consecutive sequence numbers
+    batch_results = []
+    if batch_params:
+        batch_results = await xrpl_client.create_escrows_batch(
+            wallet=disaster_wallet,
+            escrow_params=batch_params,
+            on_result=_progress_reporter(job, "xrp_escrows", len(batch_params)),
+        )
+
+    db = SessionLocal()
+    try:
+        for alloc, result in zip(allocations, batch_results):
+            org_name = org_names.get(alloc["org_id"], "Unknown")
+            if "error" in result:
+                failed_escrows += 1
+                logger.error(f"Failed to create escrow for org {alloc['org_id']} ({org_name}): {result['error']}")
+                escrow_results.append({
+                    "org_id": alloc["org_id"],
+                    "org_name": org_name,
+                    "error": result["error"],
+                })
+                continue
+
+            tx_hash = result.get("hash", "")
+            db.add(OrgEscrow(
+                disaster_id=disaster_id,
+                org_id=alloc["org_id"],
+                org_address=alloc["org_address"],
+                escrow_tx_hash=tx_hash,
+                amount_drops=alloc["amount_drops"],
+                status="locked",
+                finish_after=finish_after,
+                cancel_after=cancel_after,
+                sequence=escrow_sequence(result),
+            ))
+
+            successful_escrows += 1
+            actual_allocated_drops += alloc["amount_drops"]
+            escrow_results.append({
+                "org_id": alloc["org_id"],
+                "org_name": org_name,
+                "amount_xrp": from_drops(alloc["amount_drops"]),
+                "percentage": alloc["percentage"],
+                "escrow_tx_hash": tx_hash,
+                "finish_after": finish_after,
+            })
+
+            logger.info(f"Created escrow for {org_name}: {from_drops(alloc['amount_drops'])} XRP (tx: {tx_hash})")
+
+        # Record the actual allocation (not intended). The RLUSD pipeline writes the same row.
+        await db.execute(
+            update(Disaster)
+            .where(Disaster.disaster_id == disaster_id)
+            .values(total_allocated_drops=actual_allocated_drops)
+        )
+        await db.flush()
+        await record_lineage(db, disaster_ids=[disaster_id])
+        await db.commit()
+    finally:
+        await db.close()
+    if successful_escrows:
+        escrow_scheduler.schedule("org", disaster_id, finish_after)
+
+    logger.info(f"Escrow creation summary: {successful_escrows} successful, {failed_escrows} failed, actual allocated: {from_drops(actual_allocated_drops)} XRP")
+    if failed_escrows > 0:
+        logger.warning(f"{failed_escrows} escrows failed! Some funds may be stuck in disaster wallet.")
+
+    return {
+        "total_allocated_xrp": from_drops(actual_allocated_drops),
+        "allocations": escrow_results,
+    }
+
+
+async def _create_rlusd_escrows(req: dict, job: JobProgress, disaster_id: str, disaster_wallet: Wallet,
+                                orgs: list, org_names: dict[int, str],
+                                finish_after: int, cancel_after: int) -> dict:
+    """RLUSD TokenEscrow allocation (same architecture as XRP)."""
+    rlusd_allocations = []
+    actual_rlusd_allocated_drops = 0
+    try:
+        pool_rlusd = await xrpl_client.get_rlusd_balance(settings.POOL_WALLET_ADDRESS)
+        logger.info(f"Pool RLUSD balance: {pool_rlusd}")
+        if pool_rlusd <= 1:
+            logger.warning(f"Pool RLUSD balance too low ({pool_rlusd}), skipping RLUSD allocation")
+            return {}
+
+        rlusd_available_drops = to_drops(pool_rlusd)
+        rlusd_allocs = calculate_allocations(orgs, rlusd_available_drops, req["severity"])
+
+        # Fund disaster wallet with RLUSD from pool FIRST
+        rlusd_total_value = str(sum(from_drops(a["amount_drops"]) for a in rlusd_allocs))
+        logger.info(f"Sending {rlusd_total_value} RLUSD from pool to disaster wallet...")
+        fund_resp = await xrpl_client.submit_rlusd_payment(
+            wallet=xrpl_client.pool_wallet,
+            destination=disaster_wallet.address,
+            amount_value=rlusd_total_value,
+        )
+        fund_result_code = fund_resp.get("meta", {}).get("TransactionResult", "")
+        logger.info(f"RLUSD funding result: {fund_result_code}")
+        if fund_result_code != "tesSUCCESS":
+            raise Exception(f"RLUSD funding failed: {fund_result_code}")
+
+        rlusd_batch_params = []
+        for alloc in rlusd_allocs:
+            rlusd_value = from_drops(alloc["amount_drops"])
+            memos = [
+                Memo(
+                    memo_type=str_to_hex("rlusd_allocation"),
+                    memo_data=json_to_hex({
+                        "disaster_id": disaster_id,
+                        "org_id": alloc["org_id"],
+                    }),
+                )
+            ]
+            rlusd_batch_params.append({
+                "destination": alloc["org_address"],
+                "amount_drops": IssuedCurrencyAmount(
+                    currency=settings.RLUSD_CURRENCY_HEX,
+                    issuer=settings.RLUSD_ISSUER_ADDRESS,
+                    value=str(rlusd_value),
+                ),
+                "finish_after": finish_after,
+                "cancel_after": cancel_after,
+                "memos": memos,
+            })
+
+        logger.info(f"Creating {len(rlusd_batch_params)} RLUSD TokenEscrows...")
+        rlusd_results = await xrpl_client.create_escrows_batch(
+            wallet=disaster_wallet,
+            escrow_params=rlusd_batch_params,
+            on_result=_progress_reporter(job, "rlusd_escrows", len(rlusd_batch_params)),
+        )
+
+        db = SessionLocal()
+        try:
+            for alloc, result in zip(rlusd_allocs, rlusd_results):
+                org_name = org_names.get(alloc["org_id"], "Unknown")
+                if "error" in result:
+                    logger.error(f"RLUSD escrow for {alloc['org_id']} failed: {result['error']}")
+                    rlusd_allocations.append({
+                        "org_id": alloc["org_id"],
+                        "org_name": org_name,
+                        "currency": "RLUSD",
+                        "error": result["error"],
+                    })
+                    continue
+
+                tx_hash = result.get("hash", "")
+                db.add(OrgEscrow(
+                    disaster_id=disaster_id,
+                    org_id=alloc["org_id"],
+                    org_address=alloc["org_address"],
+                    escrow_tx_hash=tx_hash,
+                    amount_drops=alloc["amount_drops"],
+                    currency="RLUSD",
+                    status="locked",
+                    finish_after=finish_after,
+                    cancel_after=cancel_after,
+                    sequence=escrow_sequence(result),
+                ))
+
+                actual_rlusd_allocated_drops += alloc["amount_drops"]
+                rlusd_allocations.append({
+                    "org_id": alloc["org_id"],
+                    "org_name": org_name,
+                    "amount_rlusd": from_drops(alloc["amount_drops"]),
+                    "percentage": alloc["percentage"],
+                    "currency": "RLUSD",
+                    "escrow_tx_hash": tx_hash,
+                    "finish_after": finish_after,
+                })
+                logger.info(f"RLUSD escrow for {org_name}: {from_drops(alloc['amount_drops'])} RLUSD (tx: {tx_hash})")
+
+            await db.execute(
+                update(Disaster)
+                .where(Disaster.disaster_id == disaster_id)
+                .values(total_rlusd_allocated_drops=actual_rlusd_allocated_drops)
+            )
+            await db.flush()
+            await record_lineage(db, disaster_ids=[disaster_id])
+            await db.commit()
+        finally:
+            await db.close()
+        if actual_rlusd_allocated_drops:
+            escrow_scheduler.schedule("org", disaster_id, finish_after)
+    except Exception as e:
+        logger.error(f"RLUSD escrow allocation failed: {e}")
+        traceback.print_exc()
+
+    return {
+        "total_allocated_rlusd": from_drops(actual_rlusd_allocated_drops),
+        "rlusd_allocations": rlusd_allocations,
+    }
+
+
+emergency_jobs = EmergencyJobRunner()
@@ -1,91 +1,219 @@
 import asyncio
+import heapq
 import logging
+import time
 from datetime import datetime, timezone
 from xrpl.wallet import Wallet
+from sqlalchemy import bindparam, func, select, update
+from app.config import settings
 from app.database import SessionLocal
 from app.models.batch_escrow import BatchEscrow
 from app.models.org_escrow import OrgEscrow
 from app.models.disaster import Disaster
 from app.models.organization import Organization
+from app.services.lineage import record_lineage
 from app.services.xrpl_client import xrpl_client
+from app.utils.metrics import metrics
 from app.utils.crypto import decrypt_seed
 from app.utils.ripple_time import ripple_epoch_now, from_drops
 
 logger = logging.getLogger(__name__)
 
+# Seconds before retrying an escrow whose finish failed.
+RETRY_SECONDS = 10
+# Full reload from the database, for escrows scheduled by another process.
+RESYNC_SECONDS = 300
+
 
 class EscrowScheduler:
+    """
+    Finishes batch and org escrows as soon as they mature. Pending finish times live
+    in a min-heap of (finish_after, kind, key) entries, where key is a batch_id for
+    batch escrows and a disaster_id for org escrows (they are finished per disaster
+    wallet). The heap is rebuilt from the database at startup and fed by `schedule`
+    when escrows are created. Time is the last validated ledger's close time, since
+    that is what EscrowFinish is checked against; the local clock is only used while
+    the ledger stream is down.
+    """
+
     def __init__(self):
-        self.check_interval = 30
+        self.resync_interval = RESYNC_SECONDS
+        self._heap: list[tuple[int, str, str]] = []
+        self._queued: set[tuple[int, str, str]] = set()
+        self._wake = asyncio.Event()
+        self._active_lanes = 0
+        xrpl_client.stream.add_listener(self._on_stream_message)
+
+    def schedule(self, kind: str, key: str, finish_after: int):
+        """Queue a finish attempt for a "batch" (by batch_id) or "org" (by disaster_id) escrow."""
+        entry = (finish_after, kind, key)
+        if entry in self._queued:
+            return
+        self._queued.add(entry)
+        heapq.heappush(self._heap, entry)
+        self._wake.set()
+
+    def _on_stream_message(self, message: dict):
+        if message.get("type") == "ledgerClosed" and self._heap:
+            self._wake.set()
+
+    def ledger_time(self) -> int:
+        stream = xrpl_client.stream
+        if stream.is_connected() and stream.ledger_close_time is not None:
+            return stream.ledger_close_time
+        return ripple_epoch_now()
+
+    async def load(self):
+        """Rebuild the heap from every locked escrow, via the locked/finish_after indexes."""
+        async with SessionLocal() as db:
+            batches = (await db.execute(
+                select(BatchEscrow.batch_id, BatchEscrow.finish_after).filter_by(status="locked")
+            )).all()
+            orgs = (await db.execute(
+                select(OrgEscrow.disaster_id, OrgEscrow.finish_after)
+                .filter_by(status="locked")
+                .distinct()
+            )).all()
+        for batch_id, finish_after in batches:
+            self.schedule("batch", batch_id, finish_after)
+        for disaster_id, finish_after in orgs:
+            self.schedule("org", disaster_id, finish_after)
+        logger.info(f"Escrow schedule loaded: {len(batches)} batch, {len(orgs)} org finish times")
+
+    def _pop_due(self, now: int) -> tuple[set[str], set[str]]:
+        # EscrowFinish succeeds once the parent ledger closed after FinishAfter.
+        batch_ids, disaster_ids = set(), set()
+        while self._heap and self._heap[0][0] < now:
+            entry = heapq.heappop(self._heap)
+            self._queued.discard(entry)
+            _, kind, key = entry
+            (batch_ids if kind == "batch" else disaster_ids).add(key)
+        return batch_ids, disaster_ids
 
     async def run(self):
         logger.info("Escrow Scheduler started")
+        next_resync = 0
         while True:
             try:
-                await self.process_batch_escrows()
-                await self.process_org_escrows()
+                if time.monotonic() >= next_resync:
+                    await self.load()
+                    next_resync = time.monotonic() + self.resync_interval
+
+                now = self.ledger_time()
+                batch_ids, disaster_ids = self._pop_due(now)
+                # The pool wallet's batch escrows and each disaster wallet have independent
+                # sequence spaces, so all lanes finish in parallel.
+                lanes = []
+                if batch_ids:
+                    lanes.append(self.process_batch_escrows(batch_ids, now))
+                if disaster_ids:
+                    lanes.append(self.process_org_escrows(disaster_ids, now))
+                for outcome in await asyncio.gather(*lanes, return_exceptions=True):
+                    if isinstance(outcome, Exception):
+                        logger.error(f"Scheduler lane error: {outcome}")
+
+                timeout = self.resync_interval
+                if self._heap:
+                    # Ledger closes wake us while the stream is up; this is the fallback.
+                    timeout = min(timeout, max(self._heap[0][0] - now + 1, 1))
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
             except Exception as e:
                 logger.error(f"Scheduler error: {e}")
-            await asyncio.sleep(self.check_interval)
+                await asyncio.sleep(RETRY_SECONDS)
 
-    async def process_batch_escrows(self):
+    async def process_batch_escrows(self, batch_ids: set[str], now: int):
         db = SessionLocal()
         try:
-            locked = db.query(BatchEscrow).filter_by(status="locked").all()
-            current_time = ripple_epoch_now()
-
-            for batch in locked:
-                if current_time >= batch.finish_after + 1:
-                    logger.info(f"Batch {batch.batch_id} ready to finish")
-                    await self.finish_batch(db, batch)
+            ready = (await db.execute(
+                select(BatchEscrow)
+                .where(BatchEscrow.batch_id.in_(batch_ids), BatchEscrow.status == "locked")
+            )).scalars().all()
+            if not ready:
+                return
+            logger.info(f"Finishing {len(ready)} batch escrows")
+            with metrics.timed("escrow_finish.batch"):
+                retry = await self.finish_batches(db, ready)
+            for batch_id in retry:
+                self.schedule("batch", batch_id, now + RETRY_SECONDS)
         finally:
-            db.close()
+            await db.close()
 
-    async def finish_batch(self, db, batch: BatchEscrow):
-        try:
-            result = await xrpl_client.finish_escrow(
-                wallet=xrpl_client.pool_wallet,
-                owner=xrpl_client.pool_wallet.address,
-                offer_sequence=batch.sequence,
-            )
-
-            tx_result = result.get("meta", {})
-            if isinstance(tx_result, dict) and tx_result.get("TransactionResult") == "tesSUCCESS":
-                batch.status = "finished"
-                batch.finish_tx_hash = result.get("hash", "")
-                batch.finished_at = datetime.now(timezone.utc)
-                db.commit()
-                logger.info(f"Batch {batch.batch_id} finished: {result.get('hash', '')}")
-            else:
-                logger.error(f"Batch finish failed: {result}")
-
-        except Exception as e:
-            logger.error(f"Error finishing batch {batch.batch_id}: {e}")
+    async def finish_batches(self, db, batches: list[BatchEscrow]) -> list[str]:
+        """Finish pool-wallet batch escrows in one pipelined submission. Returns the batch_ids still locked."""
+        results = await xrpl_client.finish_escrows_batch(
+            wallet=xrpl_client.finisher_wallet or xrpl_client.pool_wallet,
+            escrow_params=[
+                {"owner": xrpl_client.pool_wallet.address, "offer_sequence": batch.sequence}
+                for batch in batches
+            ],
+        )
 
-    async def process_org_escrows(self):
-        db = SessionLocal()
-        try:
-            locked = db.query(OrgEscrow).filter_by(status="locked").all()
-            current_time = ripple_epoch_now()
+        retry = []
+        for batch, result in zip(batches, results):
+            if "error" in result:
+                logger.error(f"Error finishing batch {batch.batch_id}: {result['error']}")
+                metrics.increment("escrow_finish.batch.failed")
+                retry.append(batch.batch_id)
+                continue
+            batch.status = "finished"
+            batch.finish_tx_hash = result.get("hash", "")
+            batch.finished_at = datetime.now(timezone.utc)
+            metrics.increment("escrow_finish.batch.finished")
+            logger.info(f"Batch {batch.batch_id} finished: {result.get('hash', '')}")
+        finished = [b.batch_id for b in batches if b.batch_id not in retry]
+        if finished:
+            await db.flush()
+            await record_lineage(db, batch_ids=finished)
+        await db.commit()
+        return retry
 
-            # Group ready escrows by disaster_id
-            ready_by_disaster: dict[str, list[OrgEscrow]] = {}
-            for escrow in locked:
-                if current_time >= escrow.finish_after:
-                    ready_by_disaster.setdefault(escrow.disaster_id, []).append(escrow)
+    async def process_org_escrows(self, disaster_ids: set[str], now: int):
+        if xrpl_client.finisher_wallet:
+            await self.finish_with_finisher(disaster_ids, now)
+            return
+        lanes = asyncio.Semaphore(settings.ESCROW_FINISH_CONCURRENCY)
+        await asyncio.gather(*(self._finish_disaster(disaster_id, now, lanes) for disaster_id in disaster_ids))
 
-            for disaster_id, escrows in ready_by_disaster.items():
+    async def _finish_disaster(self, disaster_id: str, now: int, lanes: asyncio.Semaphore):
+        """One disaster wallet's lane. Lanes run concurrently, so each gets its own session."""
+        async with lanes:
+            self._active_lanes += 1
+            metrics.set_gauge("escrow_finish.org.active_lanes", self._active_lanes)
+            db = SessionLocal()
+            try:
+                escrows = (await db.execute(
+                    select(OrgEscrow).where(
+                        OrgEscrow.disaster_id == disaster_id,
+                        OrgEscrow.status == "locked",
+                        OrgEscrow.finish_after < now,
+                    )
+                )).scalars().all()
+                if not escrows:
+                    return
                 logger.info(f"Finishing {len(escrows)} org escrows for disaster {disaster_id}")
-                await self.finish_org_escrows_batch(db, disaster_id, escrows)
-        finally:
-            db.close()
+                with metrics.timed("escrow_finish.org"):
+                    finished = await self.finish_org_escrows_batch(db, disaster_id, escrows)
+                metrics.increment("escrow_finish.org.finished", finished)
+                metrics.increment("escrow_finish.org.failed", len(escrows) - finished)
+                if finished < len(escrows):
+                    self.schedule("org", disaster_id, now + RETRY_SECONDS)
+            finally:
+                await db.close()
+                self._active_lanes -= 1
+                metrics.set_gauge("escrow_finish.org.active_lanes", self._active_lanes)
 
-    async def finish_org_escrows_batch(self, db, disaster_id: str, escrows: list[OrgEscrow]):
+    async def finish_org_escrows_batch(self, db, disaster_id: str, escrows: list[OrgEscrow]) -> int:
+        """Finish one disaster's escrows. Returns how many finished."""
+        finished = 0
         try:
-            disaster = db.query(Disaster).filter_by(disaster_id=disaster_id).first()
+            disaster = await db.get(Disaster, disaster_id)
             if not disaster:
                 logger.error(f"Disaster {disaster_id} not found")
-                return
+                return 0
 
             disaster_wallet = Wallet.from_seed(decrypt_seed(disaster.wallet_seed_encrypted))
 
@@ -101,43 +229,115 @@ class EscrowScheduler:
                 wallet=disaster_wallet,
                 escrow_params=batch_params,
             )
+            finished = await self.record_org_finishes(db, escrows, results)
+            await self.complete_if_done(db, [disaster])
 
-            for escrow, result in zip(escrows, results):
-                if "error" in result:
-                    logger.error(f"Failed to finish org escrow {escrow.id}: {result['error']}")
-                    continue
+        except Exception as e:
+            logger.error(f"Error finishing org escrows batch for {disaster_id}: {e}")
+        return finished
 
-                tx_result = result.get("meta", {})
-                if isinstance(tx_result, dict) and tx_result.get("TransactionResult") == "tesSUCCESS":
-                    escrow.status = "finished"
-                    escrow.finish_tx_hash = result.get("hash", "")
-                    escrow.finished_at = datetime.now(timezone.utc)
+    async def finish_with_finisher(self, disaster_ids: set[str], now: int):
+        """
+        Finisher-wallet mode: anyone may finish a time-based escrow, so the finisher
+        wallet finishes every due org escrow in one pipelined submission. No disaster
+        seeds are decrypted.
+        """
+        db = SessionLocal()
+        try:
+            rows = (await db.execute(
+                select(OrgEscrow, Disaster)
+                .join(Disaster, Disaster.disaster_id == OrgEscrow.disaster_id)
+                .where(
+                    OrgEscrow.disaster_id.in_(disaster_ids),
+                    OrgEscrow.status == "locked",
+                    OrgEscrow.finish_after < now,
+                )
+            )).all()
+            if not rows:
+                return
+            escrows = [escrow for escrow, _ in rows]
+            disasters = {disaster.disaster_id: disaster for _, disaster in rows}
+            logger.info(f"Finishing {len(escrows)} org escrows for {len(disasters)} disasters with the finisher wallet")
 
-                    org = db.query(Organization).filter_by(org_id=escrow.org_id).first()
-                    if org:
-                        org.total_received_drops += escrow.amount_drops
+            with metrics.timed("escrow_finish.org"):
+                results = await xrpl_client.finish_escrows_batch(
+                    wallet=xrpl_client.finisher_wallet,
+                    escrow_params=[
+                        {"owner": disaster.wallet_address, "offer_sequence": escrow.sequence}
+                        for escrow, disaster in rows
+                    ],
+                )
+                finished = await self.record_org_finishes(db, escrows, results)
+            metrics.increment("escrow_finish.org.finished", finished)
+            metrics.increment("escrow_finish.org.failed", len(escrows) - finished)
 
-                    logger.info(
-                        f"Org escrow finished: org {escrow.org_id} received "
-                        f"{from_drops(escrow.amount_drops)} XRP | tx: {result.get('hash', '')}"
-                    )
-                else:
-                    logger.error(f"Org escrow finish failed for {escrow.id}: {result}")
+            failed = {e.disaster_id for e, r in zip(escrows, results) if "error" in r}
+            for disaster_id in failed:
+                self.schedule("org", disaster_id, now + RETRY_SECONDS)
+            await self.complete_if_done(db, [d for d_id, d in disasters.items() if d_id not in failed])
+        finally:
+            await db.close()
 
-            db.commit()
+    async def record_org_finishes(self, db, escrows: list[OrgEscrow], results: list[dict]) -> int:
+        finished = 0
+        credits: dict[int, int] = {}
+        for escrow, result in zip(escrows, results):
+            if "error" in result:
+                logger.error(f"Failed to finish org escrow {escrow.id}: {result['error']}")
+                continue
 
-            # Check if all escrows for this disaster are now finished
-            remaining = db.query(OrgEscrow).filter_by(
-                disaster_id=disaster_id, status="locked"
-            ).count()
-            if remaining == 0:
-                disaster.status = "completed"
-                disaster.completed_at = datetime.now(timezone.utc)
-                db.commit()
-                logger.info(f"Disaster {disaster_id} completed - all escrows finished")
+            tx_result = result.get("meta", {})
+            if isinstance(tx_result, dict) and tx_result.get("TransactionResult") == "tesSUCCESS":
+                escrow.status = "finished"
+                escrow.finish_tx_hash = result.get("hash", "")
+                escrow.finished_at = datetime.now(timezone.utc)
+                finished += 1
+                credits[escrow.org_id] = credits.get(escrow.org_id, 0) + escrow.amount_drops
 
-        except Exception as e:
-            logger.error(f"Error finishing org escrows batch for {disaster_id}: {e}")
+                logger.info(
+                    f"Org escrow finished: org {escrow.org_id} received "
+                    f"{from_drops(escrow.amount_drops)} XRP | tx: {result.get('hash', '')}"
+                )
+            else:
+                logger.error(f"Org escrow finish failed for {escrow.id}: {result}")
+
+        # Other disaster lanes may credit the same organization concurrently, so
+        # increment in SQL rather than read-modify-write on the ORM object. One
+        # executemany covers every organization credited by this batch.
+        if credits:
+            orgs = Organization.__table__
+            conn = await db.connection()
+            await conn.execute(
+                update(orgs)
+                .where(orgs.c.org_id == bindparam("credit_org_id"))
+                .values(total_received_drops=orgs.c.total_received_drops + bindparam("credit_drops")),
+                [{"credit_org_id": org_id, "credit_drops": drops} for org_id, drops in credits.items()],
+            )
+        await db.commit()
+        return finished
+
+    async def complete_if_done(self, db, disasters: list[Disaster]):
+        """Mark the disasters with no locked escrows left as completed."""
+        if not disasters:
+            return
+        locked = dict((await db.execute(
+            select(OrgEscrow.disaster_id, func.count(OrgEscrow.id))
+            .where(
+                OrgEscrow.disaster_id.in_([d.disaster_id for d in disasters]),
+                OrgEscrow.status == "locked",
+            )
+            .group_by(OrgEscrow.disaster_id)
+        )).all())
+        completed = [d for d in disasters if not locked.get(d.disaster_id)]
+        if not completed:
+            return
+        for disaster in completed:
+            disaster.status = "completed"
+            disaster.completed_at = datetime.now(timezone.utc)
+        await db.commit()
+        for disaster in completed:
+            await xrpl_client.stream.unwatch_account(disaster.wallet_address)
+            logger.info(f"Disaster {disaster.disaster_id} completed - all escrows finished")
 
 
 escrow_scheduler = EscrowScheduler()
@@ -0,0 +1,59 @@
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import BigInteger, Numeric, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from app.models.batch_escrow import BatchEscrow
+from app.models.disaster import Disaster
+from app.models.donation import Donation
+from app.models.donation_lineage import DonationLineage
+from app.models.org_escrow import OrgEscrow
+
+logger = logging.getLogger(__name__)
+
+
+async def record_lineage(db, disaster_ids: Optional[list[str]] = None,
+                         batch_ids: Optional[list[str]] = None) -> int:
+    """
+    Link donations to the org escrows they funded, in one INSERT ... SELECT.
+
+    A donation funds every disaster created after its batch was released, and its
+    share of each org escrow is escrow amount x donation amount / batch total. Pass
+    the disasters that just got escrows or the batches that just finished; with
+    neither, the whole table is rebuilt (the backfill). Existing rows are kept.
+    Returns the number of rows added; the caller commits.
+    """
+    share = func.floor(
+        cast(OrgEscrow.amount_drops, Numeric) * Donation.amount_drops / BatchEscrow.total_amount_drops
+    )
+    query = (
+        select(
+            Donation.id,
+            BatchEscrow.batch_id,
+            Disaster.disaster_id,
+            OrgEscrow.id,
+            cast(share, BigInteger),
+            literal(datetime.now(timezone.utc)),
+        )
+        .select_from(Donation)
+        .join(BatchEscrow, BatchEscrow.batch_id == Donation.batch_id)
+        .join(Disaster, Disaster.created_at >= BatchEscrow.finished_at)
+        .join(OrgEscrow, OrgEscrow.disaster_id == Disaster.disaster_id)
+        .where(
+            BatchEscrow.status == "finished",
+            BatchEscrow.total_amount_drops > 0,
+        )
+    )
+    if disaster_ids is not None:
+        query = query.where(Disaster.disaster_id.in_(disaster_ids))
+    if batch_ids is not None:
+        query = query.where(BatchEscrow.batch_id.in_(batch_ids))
+
+    stmt = insert(DonationLineage).from_select(
+        ["donation_id", "batch_id", "disaster_id", "org_escrow_id", "share_drops", "created_at"],
+        query,
+    ).on_conflict_do_nothing(constraint="uq_donation_lineage_donation_escrow")
+    added = (await db.execute(stmt)).rowcount
+    if added:
+        logger.info(f"Recorded {added} donation lineage rows")
+    return added
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import func, select, update
+from xrpl.wallet import Wallet
+from app.config import settings
+from app.database import SessionLocal
+from app.models.warm_wallet import WarmWallet
+from app.services.xrpl_client import xrpl_client
+from app.utils.crypto import encrypt_seed, decrypt_seed
+
+logger = logging.getLogger(__name__)
+
+ACTIVATION_ATTEMPTS = 15
+ACTIVATION_POLL_SECONDS = 2
+REFILL_CHECK_SECONDS = 60
+
+
+async def activate_wallet(wallet: Wallet) -> bool:
+    """Fund a new wallet from the faucet and wait until it exists on-ledger."""
+    try:
+        funded = await xrpl_client.fund_account(wallet.address)
+        logger.info(f"Faucet funding for {wallet.address}: {'success' if funded else 'failed'}")
+    except Exception as e:
+        logger.warning(f"Faucet funding failed (non-critical): {e}")
+
+    # The faucet returns before the account is validated
+    for attempt in range(ACTIVATION_ATTEMPTS):
+        try:
+            await xrpl_client.get_account_info(wallet.address)
+            logger.info(f"Wallet {wallet.address} confirmed on-ledger after {attempt + 1} attempt(s)")
+            return True
+        except Exception:
+            await asyncio.sleep(ACTIVATION_POLL_SECONDS)
+    return False
+
+
+class WalletPool:
+    """
+    Keeps WARM_WALLET_POOL_SIZE disaster wallets activated (and holding an RLUSD
+    trust line when RLUSD is configured) so an emergency trigger can claim one
+    instead of waiting on the faucet. Seeds are stored encrypted like disaster seeds.
+    """
+
+    def __init__(self):
+        self.target = settings.WARM_WALLET_POOL_SIZE
+        self._refill = asyncio.Event()
+
+    async def run(self):
+        if self.target <= 0:
+            return
+        logger.info(f"Warm wallet pool started (target {self.target})")
+        while True:
+            try:
+                await self.fill()
+            except Exception as e:
+                logger.error(f"Warm wallet pool error: {e}")
+            self._refill.clear()
+            try:
+                await asyncio.wait_for(self._refill.wait(), REFILL_CHECK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def ready_count(self) -> int:
+        async with SessionLocal() as db:
+            return await db.scalar(
+                select(func.count(WarmWallet.address)).filter_by(status="ready")
+            )
+
+    async def fill(self):
+        # One at a time: the faucet rate-limits and there is no rush once the pool is non-empty.
+        while await self.ready_count() < self.target:
+            if not await self.add_wallet():
+                return
+
+    async def add_wallet(self) -> bool:
+        wallet = Wallet.create()
+        if not await activate_wallet(wallet):
+            logger.warning(f"Warm wallet {wallet.address} failed to activate")
+            return False
+
+        has_trustline = False
+        if settings.RLUSD_ISSUER_ADDRESS:
+            try:
+                resp = await xrpl_client.set_rlusd_trustline(wallet)
+                has_trustline = resp.get("meta", {}).get("TransactionResult", "") == "tesSUCCESS"
+            except Exception as e:
+                logger.warning(f"RLUSD TrustLine on warm wallet {wallet.address} failed: {e}")
+
+        async with SessionLocal() as db:
+            db.add(WarmWallet(
+                address=wallet.address,
+                seed_encrypted=encrypt_seed(wallet.seed),
+                has_trustline=has_trustline,
+                status="ready",
+            ))
+            await db.commit()
+        logger.info(f"Warm wallet {wallet.address} ready (trustline: {has_trustline})")
+        return True
+
+    async def claim(self, db, need_trustline: bool = False) -> Optional[tuple[Wallet, bool]]:
+        """
+        Take a ready wallet, or None if the pool is empty. SKIP LOCKED lets concurrent
+        triggers each get a different wallet without waiting on one another.
+        """
+        stmt = select(WarmWallet).filter_by(status="ready")
+        if need_trustline:
+            stmt = stmt.filter_by(has_trustline=True)
+        warm = (await db.execute(
+            stmt.order_by(WarmWallet.created_at).limit(1).with_for_update(skip_locked=True)
+        )).scalars().first()
+        if warm is None:
+            self._refill.set()
+            return None
+
+        claimed = Wallet.from_seed(decrypt_seed(warm.seed_encrypted)), warm.has_trustline
+        warm.status = "claimed"
+        warm.claimed_at = datetime.now(timezone.utc)
+        await db.commit()
+        self._refill.set()
+        return claimed
+
+    async def release(self, wallet: Wallet, has_trustline: bool):
+        """
+        Return a wallet to the pool after a trigger failed before any disaster took it.
+        A wallet activated on demand (never in the pool) is added rather than dropped.
+        """
+        async with SessionLocal() as db:
+            result = await db.execute(
+                update(WarmWallet)
+                .where(WarmWallet.address == wallet.address)
+                .values(status="ready", claimed_at=None, has_trustline=has_trustline)
+            )
+            if result.rowcount == 0:
+                db.add(WarmWallet(
+                    address=wallet.address,
+                    seed_encrypted=encrypt_seed(wallet.seed),
+                    has_trustline=has_trustline,
+                    status="ready",
+                ))
+            await db.commit()
+        logger.info(f"Warm wallet {wallet.address} released back to the pool")
+
+
+wallet_pool = WalletPool()
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+def touched_accounts(message: dict) -> set[str]:
+    """Accounts whose state a validated transaction changed, from its fields and metadata."""
+    tx = message.get("transaction") or message.get("tx_json") or {}
+    accounts = {tx.get("Account"), tx.get("Destination"), tx.get("Owner")}
+    for node in message.get("meta", {}).get("AffectedNodes", []):
+        for change in node.values():
+            fields = change.get("FinalFields") or change.get("NewFields") or {}
+            accounts.add(fields.get("Account"))
+            for side in ("HighLimit", "LowLimit"):
+                accounts.add(fields.get(side, {}).get("issuer"))
+    accounts.discard(None)
+    return accounts
+
+
+# How long to remember that a transaction touched an account. Reads come from nodes
+# at most XRPL_MAX_LEDGER_LAG behind, far inside this.
+TOUCHED_RETENTION_LEDGERS = 256
+
+
+def response_ledger(result: Any):
+    """The validated ledger a response was read at, if it says."""
+    return result.get("ledger_index") if isinstance(result, dict) else None
+
+
+class LedgerCache:
+    """
+    Read-through cache for ledger queries, keyed by the validated ledger they were read at.
+
+    Entries are only reused within the same validated ledger, except for `sticky` keys
+    (platform wallets), which stay valid across ledger closes until a validated
+    transaction touching their account arrives on the stream. Concurrent misses for the
+    same key share one in-flight request.
+
+    An account's entries are only stored when the response was read at or after the
+    last validated transaction touching that account. This covers fetches that
+    straddle an invalidation and nodes lagging behind the stream. An invalidation
+    also detaches in-flight fetches for the account, so later callers start a fresh one.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._entries: dict[Hashable, tuple[int, str, bool, Any]] = {}
+        self._inflight: dict[Hashable, tuple[asyncio.Task, str]] = {}
+        # account -> ledger index of the last validated transaction that touched it
+        self._touched: dict[str, int] = {}
+        stream.add_listener(self.on_stream_message)
+
+    def _current_ledger(self):
+        return self.stream.validated_ledger_index if self.stream.is_connected() else None
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]],
+                  account: str = None, sticky: bool = False) -> Any:
+        ledger_index = self._current_ledger()
+        if ledger_index is not None:
+            entry = self._entries.get(key)
+            if entry and (entry[0] == ledger_index or entry[2]):
+                return entry[3]
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            task = asyncio.create_task(fetch())
+            self._inflight[key] = (task, account)
+            task.add_done_callback(lambda t: self._store(key, t, ledger_index, account, sticky))
+        else:
+            task = inflight[0]
+        # Shield so one caller giving up doesn't cancel the request for everyone else.
+        return await asyncio.shield(task)
+
+    def _store(self, key, task: asyncio.Task, ledger_index, account, sticky):
+        if self._inflight.get(key, (None,))[0] is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None or ledger_index is None:
+            return
+        result = task.result()
+        if account is not None:
+            read_at = response_ledger(result)
+            if read_at is None or read_at < self._touched.get(account, 0):
+                return
+        self._entries[key] = (ledger_index, account, sticky, result)
+
+    def invalidate_account(self, address: str, ledger_index: int = None):
+        if ledger_index is not None and ledger_index > self._touched.get(address, 0):
+            self._touched[address] = ledger_index
+        for key in [k for k, entry in self._entries.items() if entry[1] == address]:
+            del self._entries[key]
+        for key in [k for k, (_, account) in self._inflight.items() if account == address]:
+            del self._inflight[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._inflight.clear()
+
+    def on_stream_message(self, message: dict):
+        msg_type = message.get("type")
+        if msg_type == "ledgerClosed":
+            self._prune(message.get("ledger_index"))
+        elif msg_type == "transaction" and message.get("validated"):
+            for address in touched_accounts(message):
+                self.invalidate_account(address, message.get("ledger_index"))
+        elif msg_type == "subscribed":
+            # We may have missed invalidations while the stream was down.
+            self.clear()
+
+    def _prune(self, ledger_index):
+        if ledger_index is None:
+            return
+        stale = [k for k, entry in self._entries.items() if entry[0] < ledger_index and not entry[2]]
+        for key in stale:
+            del self._entries[key]
+        forgotten = [a for a, touched in self._touched.items() if touched < ledger_index - TOUCHED_RETENTION_LEDGERS]
+        for address in forgotten:
+            del self._touched[address]
@@ -1,17 +1,81 @@
+import asyncio
 import logging
-from xrpl.asyncio.clients import AsyncWebsocketClient
-from xrpl.asyncio.transaction import submit_and_wait, autofill
+from typing import Awaitable, Callable, Optional
+from xrpl.asyncio.transaction import autofill, autofill_and_sign, sign, submit
 from xrpl.asyncio.account import get_balance
-from xrpl.asyncio.ledger import get_fee
-from xrpl.models.requests import AccountInfo, AccountLines, AccountObjects, Tx, ServerInfo, SubmitOnly
-from xrpl.models.transactions import Payment, EscrowCreate, EscrowFinish
+from xrpl.asyncio.ledger import get_fee, get_latest_validated_ledger_sequence
+from xrpl.models.requests import AccountInfo, AccountLines, AccountObjects, AccountTx, Tx, ServerInfo, SubmitOnly
+from xrpl.models.transactions import Payment, EscrowCreate, EscrowFinish, TrustSet, TicketCreate
 from xrpl.models.amounts import IssuedCurrencyAmount
 from xrpl.wallet import Wallet
 from xrpl.utils import xrp_to_drops
 from app.config import settings
+from app.services.xrpl_nodes import XRPLNodeRouter
+from app.services.xrpl_stream import LedgerStream, TransactionExpired
+from app.services.xrpl_sequence import SequenceManager, AccountSequence, PAST_SEQUENCE, FUTURE_SEQUENCE
+from app.services.xrpl_tickets import TicketPool, load_tickets
+from app.services.xrpl_cache import LedgerCache
+from app.utils.ripple_time import hex_to_json, str_to_hex
 
 logger = logging.getLogger(__name__)
 
+# Extra ledgers of headroom on top of autofill's LastLedgerSequence so the tail of a
+# long pipelined batch still has time to validate.
+PIPELINE_LEDGER_WINDOW = 10
+
+# How long to wait on the ledger stream before falling back to polling Tx.
+STREAM_CONFIRM_TIMEOUT_SECONDS = 120
+
+TICKET_REFILL_CHECK_SECONDS = 30
+
+
+def _with_fields(tx, **fields):
+    """Return a copy of an (immutable) transaction model with the given fields set."""
+    return type(tx).from_dict({**tx.to_dict(), **fields})
+
+
+class SubmitRejected(Exception):
+    """The node rejected a transaction outright (tem/tef/tel); it was not applied."""
+
+    def __init__(self, engine_result: str, message: str = ""):
+        self.engine_result = engine_result
+        super().__init__(f"{engine_result}: {message}")
+
+
+def escrow_sequence(result: dict) -> int:
+    """
+    The OfferSequence an EscrowFinish needs for an escrow created by `result`:
+    the TicketSequence when the EscrowCreate used a Ticket, its Sequence otherwise.
+    """
+    tx = result.get("tx_json") or {}
+    return (
+        result.get("TicketSequence") or tx.get("TicketSequence")
+        or result.get("Sequence") or tx.get("Sequence", 0)
+    )
+
+
+ResultCallback = Optional[Callable[[int, dict], Awaitable[None]]]
+
+
+async def _notify(on_result: ResultCallback, index: int, result: dict):
+    """
+    Report one settled transaction. The callback is only progress reporting: its
+    failure must not cost the caller the results of transactions already on-ledger.
+    """
+    if on_result is None:
+        return
+    try:
+        await on_result(index, result)
+    except Exception as e:
+        logger.error(f"Result callback for #{index} failed: {e}")
+
+
+def _check_validated(result: dict) -> dict:
+    tx_result = result.get("meta", {}).get("TransactionResult", "")
+    if tx_result != "tesSUCCESS":
+        raise Exception(f"Transaction failed: {tx_result}")
+    return result
+
 
 class XRPLClient:
     def __init__(self):
@@ -21,99 +85,192 @@ class XRPLClient:
         self.rlusd_issuer_wallet = None
         if settings.RLUSD_ISSUER_SECRET:
             self.rlusd_issuer_wallet = Wallet.from_seed(settings.RLUSD_ISSUER_SECRET)
+        self.finisher_wallet = None
+        if settings.FINISHER_WALLET_SECRET:
+            self.finisher_wallet = Wallet.from_seed(settings.FINISHER_WALLET_SECRET)
+        node_urls = [u.strip() for u in settings.XRPL_NODE_URLS.split(",") if u.strip()] or [self.url]
+        self.nodes = XRPLNodeRouter(
+            node_urls,
+            submit_url=settings.XRPL_SUBMIT_NODE_URL or None,
+            pool_size=settings.XRPL_POOL_SIZE,
+            max_in_flight=settings.XRPL_MAX_IN_FLIGHT_PER_CONNECTION,
+            health_check_interval=settings.XRPL_HEALTH_CHECK_SECONDS,
+            max_ledger_lag=settings.XRPL_MAX_LEDGER_LAG,
+            hedged_reads=settings.XRPL_HEDGED_READS,
+            hedge_delay_ms=settings.XRPL_HEDGE_DELAY_MS,
+        )
+        self.stream = LedgerStream(self.nodes.urls)
+        self.cache = LedgerCache(self.stream)
+        self.sequences = SequenceManager(self.nodes)
+        # Hot wallets get a Ticket lane so independent transactions don't queue behind each other.
+        self.tickets: dict[str, TicketPool] = {}
+        if settings.XRPL_TICKETS_ENABLED:
+            for wallet in self.hot_wallets:
+                self.tickets[wallet.address] = TicketPool(
+                    wallet.address, settings.XRPL_TICKET_POOL_TARGET, settings.XRPL_TICKET_LOW_WATER
+                )
+        self._ticket_refill_needed = asyncio.Event()
+        self._ticket_task: Optional[asyncio.Task] = None
+        # Most recent fee read from the network, for when a fresh lookup fails.
+        self.last_fee: Optional[str] = None
+
+    @property
+    def platform_addresses(self) -> list[str]:
+        return [wallet.address for wallet in self.hot_wallets]
 
-    async def get_client(self) -> AsyncWebsocketClient:
-        client = AsyncWebsocketClient(self.url)
-        return client
+    @property
+    def hot_wallets(self) -> list[Wallet]:
+        wallets = [self.pool_wallet, self.reserve_wallet]
+        if self.rlusd_issuer_wallet:
+            wallets.append(self.rlusd_issuer_wallet)
+        if self.finisher_wallet:
+            wallets.append(self.finisher_wallet)
+        return wallets
+
+    async def start(self, watch_accounts: list[str] = ()):
+        await self.nodes.start()
+        await self.stream.start(self.platform_addresses + list(watch_accounts))
+        if self.tickets and self._ticket_task is None:
+            self._ticket_task = asyncio.create_task(self._ticket_refill_loop())
+
+    async def close(self):
+        if self._ticket_task:
+            self._ticket_task.cancel()
+            self._ticket_task = None
+        await self.stream.close()
+        await self.nodes.close()
 
     async def get_account_info(self, address: str) -> dict:
-        async with AsyncWebsocketClient(self.url) as client:
-            response = await client.request(AccountInfo(account=address, ledger_index="validated"))
-            if response.is_successful():
-                return response.result
-            raise Exception(f"Failed to get account info: {response.result}")
+        # Platform wallets only change through validated transactions we see on the stream,
+        # so their account data is kept until one arrives rather than refetched every ledger.
+        return await self.cache.get(
+            ("account_info", address),
+            lambda: self._fetch_account_info(address),
+            account=address,
+            sticky=address in self.platform_addresses,
+        )
+
+    async def _fetch_account_info(self, address: str) -> dict:
+        response = await self.nodes.request(AccountInfo(account=address, ledger_index="validated"))
+        if response.is_successful():
+            return response.result
+        raise Exception(f"Failed to get account info: {response.result}")
 
     async def get_account_balance(self, address: str) -> int:
-        async with AsyncWebsocketClient(self.url) as client:
+        async with self.nodes.connection() as client:
             balance = await get_balance(address, client)
             return int(xrp_to_drops(balance))
 
     async def get_account_escrows(self, address: str) -> list:
-        async with AsyncWebsocketClient(self.url) as client:
-            response = await client.request(
-                AccountObjects(account=address, type="escrow", ledger_index="validated")
-            )
-            if response.is_successful():
-                return response.result.get("account_objects", [])
-            return []
+        response = await self.nodes.request(
+            AccountObjects(account=address, type="escrow", ledger_index="validated")
+        )
+        if response.is_successful():
+            return response.result.get("account_objects", [])
+        return []
 
     async def get_tx(self, tx_hash: str) -> dict:
-        async with AsyncWebsocketClient(self.url) as client:
-            response = await client.request(Tx(transaction=tx_hash))
-            if response.is_successful():
-                return response.result
-            raise Exception(f"Failed to get tx: {response.result}")
+        response = await self.nodes.request(Tx(transaction=tx_hash))
+        if response.is_successful():
+            return response.result
+        raise Exception(f"Failed to get tx: {response.result}")
+
+    async def find_memo_transactions(self, address: str, memo_type: str, since: int) -> list[tuple[dict, dict]]:
+        """
+        Validated, successful transactions sent by `address` with a JSON memo of
+        `memo_type`, newest first, back to ripple time `since`. Returns (memo, result)
+        pairs, each result shaped like a submission's (hash, tx_json, meta).
+        """
+        memo_type_hex = str_to_hex(memo_type)
+        found = []
+        marker = None
+        while True:
+            response = await self.nodes.request(AccountTx(
+                account=address, ledger_index_min=-1, ledger_index_max=-1,
+                forward=False, limit=200, marker=marker,
+            ))
+            if not response.is_successful():
+                raise Exception(f"Failed to get account transactions: {response.result}")
+            for entry in response.result.get("transactions", []):
+                tx = entry.get("tx_json") or entry.get("tx") or {}
+                if tx.get("date", since) < since:
+                    return found
+                meta = entry.get("meta") or {}
+                if tx.get("Account") != address or meta.get("TransactionResult") != "tesSUCCESS":
+                    continue
+                for memo in tx.get("Memos", []):
+                    fields = memo.get("Memo", {})
+                    if fields.get("MemoType", "").upper() != memo_type_hex:
+                        continue
+                    try:
+                        data = hex_to_json(fields.get("MemoData", ""))
+                    except ValueError:
+                        continue
+                    found.append((data, {"hash": entry.get("hash") or tx.get("hash"), "tx_json": tx, "meta": meta}))
+            marker = response.result.get("marker")
+            if marker is None:
+                return found
 
     async def get_recommended_fee(self) -> str:
-        async with AsyncWebsocketClient(self.url) as client:
+        return await self.cache.get(("fee",), self._fetch_recommended_fee)
+
+    async def _fetch_recommended_fee(self) -> str:
+        async with self.nodes.connection() as client:
             fee = await get_fee(client)
-            return str(fee)
+        self.last_fee = str(fee)
+        return self.last_fee
 
     async def get_server_info(self) -> dict:
-        async with AsyncWebsocketClient(self.url) as client:
-            response = await client.request(ServerInfo())
-            if response.is_successful():
-                return response.result
-            raise Exception(f"Failed to get server info: {response.result}")
+        return await self.cache.get(("server_info",), self._fetch_server_info)
+
+    async def _fetch_server_info(self) -> dict:
+        response = await self.nodes.request(ServerInfo())
+        if response.is_successful():
+            return response.result
+        raise Exception(f"Failed to get server info: {response.result}")
 
     async def submit_payment(self, wallet: Wallet, destination: str, amount_drops: int, memos: list = None) -> dict:
-        async with AsyncWebsocketClient(self.url) as client:
+        tx = Payment(
+            account=wallet.address,
+            destination=destination,
+            amount=str(amount_drops),
+        )
+        if memos:
             tx = Payment(
                 account=wallet.address,
                 destination=destination,
                 amount=str(amount_drops),
+                memos=memos,
             )
-            if memos:
-                tx = Payment(
-                    account=wallet.address,
-                    destination=destination,
-                    amount=str(amount_drops),
-                    memos=memos,
-                )
-            response = await submit_and_wait(tx, client, wallet)
-            return response.result
+        return await self._submit_and_confirm(wallet, tx)
 
     async def create_escrow(self, wallet: Wallet, destination: str, amount_drops,
                             finish_after: int, cancel_after: int = None, memos: list = None) -> dict:
-        async with AsyncWebsocketClient(self.url) as client:
-            # amount_drops can be int/str (XRP) or IssuedCurrencyAmount (RLUSD via TokenEscrow)
-            amount = amount_drops if isinstance(amount_drops, IssuedCurrencyAmount) else str(amount_drops)
-            kwargs = {
-                "account": wallet.address,
-                "destination": destination,
-                "amount": amount,
-                "finish_after": finish_after,
-            }
-            if cancel_after:
-                kwargs["cancel_after"] = cancel_after
-            if memos:
-                kwargs["memos"] = memos
-            tx = EscrowCreate(**kwargs)
-            response = await submit_and_wait(tx, client, wallet)
-            return response.result
+        # amount_drops can be int/str (XRP) or IssuedCurrencyAmount (RLUSD via TokenEscrow)
+        amount = amount_drops if isinstance(amount_drops, IssuedCurrencyAmount) else str(amount_drops)
+        kwargs = {
+            "account": wallet.address,
+            "destination": destination,
+            "amount": amount,
+            "finish_after": finish_after,
+        }
+        if cancel_after:
+            kwargs["cancel_after"] = cancel_after
+        if memos:
+            kwargs["memos"] = memos
+        tx = EscrowCreate(**kwargs)
+        return await self._submit_and_confirm(wallet, tx)
 
     async def finish_escrow(self, wallet: Wallet, owner: str, offer_sequence: int) -> dict:
-        async with AsyncWebsocketClient(self.url) as client:
-            tx = EscrowFinish(
-                account=wallet.address,
-                owner=owner,
-                offer_sequence=offer_sequence,
-            )
-            response = await submit_and_wait(tx, client, wallet)
-            return response.result
+        tx = EscrowFinish(
+            account=wallet.address,
+            owner=owner,
+            offer_sequence=offer_sequence,
+        )
+        return await self._submit_and_confirm(wallet, tx)
 
     async def submit_signed_tx(self, tx_blob: str) -> dict:
-        async with AsyncWebsocketClient(self.url) as client:
+        async with self.nodes.connection(pinned=True) as client:
             response = await client.request(SubmitOnly(tx_blob=tx_blob))
             if response.is_successful():
                 result = response.result
@@ -123,130 +280,350 @@ class XRPLClient:
                 return result
             raise Exception(f"Submit failed: {response.result}")
 
-    async def create_escrows_batch(self, wallet: Wallet, escrow_params: list[dict]) -> list[dict]:
-        """Create multiple escrows using a single WebSocket connection with manual sequence numbering."""
+    async def create_escrows_batch(self, wallet: Wallet, escrow_params: list[dict],
+                                   pipelined: bool = True, on_result: ResultCallback = None) -> list[dict]:
+        """
+        Create multiple escrows from one wallet. Results come back in input order;
+        `on_result(index, result)` is awaited as each one settles.
+        """
+        txs = []
+        for params in escrow_params:
+            # amount can be int/str (XRP) or IssuedCurrencyAmount (RLUSD)
+            raw_amount = params["amount_drops"]
+            amount = raw_amount if isinstance(raw_amount, IssuedCurrencyAmount) else str(raw_amount)
+            kwargs = {
+                "account": wallet.address,
+                "destination": params["destination"],
+                "amount": amount,
+                "finish_after": params["finish_after"],
+            }
+            if params.get("cancel_after"):
+                kwargs["cancel_after"] = params["cancel_after"]
+            if params.get("memos"):
+                kwargs["memos"] = params["memos"]
+            txs.append(EscrowCreate(**kwargs))
+        return await self._submit_batch(wallet, txs, "escrow create", pipelined, on_result)
+
+    async def finish_escrows_batch(self, wallet: Wallet, escrow_params: list[dict],
+                                   pipelined: bool = True) -> list[dict]:
+        """Finish multiple escrows from one wallet. Results come back in input order."""
+        txs = [
+            EscrowFinish(
+                account=wallet.address,
+                owner=params["owner"],
+                offer_sequence=params["offer_sequence"],
+            )
+            for params in escrow_params
+        ]
+        return await self._submit_batch(wallet, txs, "escrow finish", pipelined)
+
+    async def _submit_batch(self, wallet: Wallet, txs: list, label: str, pipelined: bool,
+                            on_result: ResultCallback = None) -> list[dict]:
+        if not txs:
+            return []
+        if pipelined:
+            return await self._submit_pipelined(wallet, txs, label, on_result)
+
         results = []
-        async with AsyncWebsocketClient(self.url) as client:
-            # Fetch account sequence once
-            acct_info = await client.request(AccountInfo(account=wallet.address, ledger_index="current"))
-            if not acct_info.is_successful():
-                raise Exception(f"Failed to get account info: {acct_info.result}")
-            base_sequence = acct_info.result["account_data"]["Sequence"]
-
-            for i, params in enumerate(escrow_params):
-                try:
-                    # amount can be int/str (XRP) or IssuedCurrencyAmount (RLUSD)
-                    raw_amount = params["amount_drops"]
-                    amount = raw_amount if isinstance(raw_amount, IssuedCurrencyAmount) else str(raw_amount)
-                    kwargs = {
-                        "account": wallet.address,
-                        "destination": params["destination"],
-                        "amount": amount,
-                        "finish_after": params["finish_after"],
-                        "sequence": base_sequence + i,
-                    }
-                    if params.get("cancel_after"):
-                        kwargs["cancel_after"] = params["cancel_after"]
-                    if params.get("memos"):
-                        kwargs["memos"] = params["memos"]
-
-                    tx = EscrowCreate(**kwargs)
-                    tx_filled = await autofill(tx, client)
-                    response = await submit_and_wait(tx_filled, client, wallet, autofill=False)
-                    results.append(response.result)
-                except Exception as e:
-                    logger.error(f"Batch escrow create #{i} failed: {e}")
-                    results.append({"error": str(e), "index": i})
+        for i, tx in enumerate(txs):
+            try:
+                results.append(await self._submit_and_confirm(wallet, tx))
+            except Exception as e:
+                logger.error(f"Batch {label} #{i} failed: {e}")
+                results.append({"error": str(e), "index": i})
+            await _notify(on_result, i, results[i])
         return results
 
-    async def finish_escrows_batch(self, wallet: Wallet, escrow_params: list[dict]) -> list[dict]:
-        """Finish multiple escrows using a single WebSocket connection with manual sequence numbering."""
-        results = []
-        async with AsyncWebsocketClient(self.url) as client:
-            acct_info = await client.request(AccountInfo(account=wallet.address, ledger_index="current"))
-            if not acct_info.is_successful():
-                raise Exception(f"Failed to get account info: {acct_info.result}")
-            base_sequence = acct_info.result["account_data"]["Sequence"]
+    async def _submit_pipelined(self, wallet: Wallet, txs: list, label: str,
+                                on_result: ResultCallback = None) -> list[dict]:
+        """
+        Autofill fee and LastLedgerSequence once, sign and submit every transaction
+        back to back, then wait for all validations concurrently.
+        """
+        results: list = [None] * len(txs)
+        submitted = {}
+        async with self.nodes.connection(pinned=True) as client:
+            # Autofilling the first transaction gives us Fee, LastLedgerSequence and
+            # NetworkID for the whole batch in one round of lookups.
+            template = await autofill(_with_fields(txs[0], sequence=0), client)
+            shared = {
+                "fee": template.fee,
+                "last_ledger_sequence": template.last_ledger_sequence + PIPELINE_LEDGER_WINDOW,
+            }
+            if template.network_id is not None:
+                shared["network_id"] = template.network_id
 
-            for i, params in enumerate(escrow_params):
+            tickets = self._take_tickets(wallet.address, len(txs))
+            for i, ticket in enumerate(tickets):
                 try:
-                    tx = EscrowFinish(
-                        account=wallet.address,
-                        owner=params["owner"],
-                        offer_sequence=params["offer_sequence"],
-                        sequence=base_sequence + i,
-                    )
-                    tx_filled = await autofill(tx, client)
-                    response = await submit_and_wait(tx_filled, client, wallet, autofill=False)
-                    results.append(response.result)
+                    submitted[i] = await self._send_ticketed(client, wallet, _with_fields(txs[i], **shared), ticket)
                 except Exception as e:
-                    logger.error(f"Batch escrow finish #{i} failed: {e}")
-                    results.append({"error": str(e), "index": i})
+                    logger.error(f"Batch {label} #{i} failed: {e}")
+                    results[i] = {"error": str(e), "index": i}
+
+            if len(tickets) < len(txs):
+                async with self.sequences.reserve(wallet.address) as account:
+                    for i in range(len(tickets), len(txs)):
+                        try:
+                            submitted[i] = await self._send_next(client, account, wallet, _with_fields(txs[i], **shared))
+                        except Exception as e:
+                            logger.error(f"Batch {label} #{i} failed: {e}")
+                            results[i] = {"error": str(e), "index": i}
+
+        async def settle(i, signed, waiter):
+            try:
+                results[i] = await self._confirm(signed, waiter)
+            except Exception as e:
+                logger.error(f"Batch {label} #{i} failed: {e}")
+                results[i] = {"error": str(e), "index": i}
+            await _notify(on_result, i, results[i])
+
+        await asyncio.gather(*(settle(i, signed, waiter) for i, (signed, waiter) in submitted.items()))
+        for i in range(len(txs)):
+            if i not in submitted:
+                await _notify(on_result, i, results[i])
         return results
 
+    async def _submit_and_confirm(self, wallet: Wallet, tx, use_tickets: bool = True) -> dict:
+        """Autofill, sign and submit one transaction, then wait for it to validate."""
+        async with self.nodes.connection(pinned=True) as client:
+            # Placeholder sequence stops autofill fetching one; the real number is assigned in the queue.
+            filled = await autofill(_with_fields(tx, sequence=0), client)
+            tickets = self._take_tickets(wallet.address, 1) if use_tickets else []
+            if tickets:
+                signed, waiter = await self._send_ticketed(client, wallet, filled, tickets[0])
+            else:
+                async with self.sequences.reserve(wallet.address) as account:
+                    signed, waiter = await self._send_next(client, account, wallet, filled)
+        return await self._confirm(signed, waiter)
+
+    def _take_tickets(self, address: str, count: int) -> list[int]:
+        pool = self.tickets.get(address)
+        if pool is None:
+            return []
+        tickets = pool.take(count)
+        if pool.refill_count():
+            self._ticket_refill_needed.set()
+        return tickets
+
+    async def _send_ticketed(self, client, wallet: Wallet, tx, ticket: int):
+        """
+        Sign against a Ticket instead of the account Sequence and submit. If the Ticket
+        was already used (by another process, or before a restart) nothing was applied,
+        so the transaction goes once more on the sequence lane. Callers must not hold
+        the account's sequence queue.
+        """
+        signed = sign(_with_fields(tx, sequence=0, ticket_sequence=ticket), wallet)
+        try:
+            waiter, _ = await self._send(client, signed)
+        except SubmitRejected as e:
+            if e.engine_result != "tefNO_TICKET":
+                self.tickets[wallet.address].give_back(ticket)
+                raise
+            self.tickets[wallet.address].consumed(ticket)
+            logger.warning(f"Ticket {ticket} of {wallet.address} already used, resubmitting with a sequence number")
+            async with self.sequences.reserve(wallet.address) as account:
+                return await self._send_next(client, account, wallet, tx)
+        except Exception:
+            self.tickets[wallet.address].give_back(ticket)
+            raise
+        return signed, waiter
+
+    async def _send_next(self, client, account: AccountSequence, wallet: Wallet, tx):
+        """
+        Sign with the account's next sequence number and submit. Must be called while
+        holding the account's queue. A rejected transaction does not consume its number.
+        """
+        for attempt in range(2):
+            signed = sign(_with_fields(tx, sequence=account.next_sequence), wallet)
+            try:
+                waiter, engine_result = await self._send(client, signed)
+            except SubmitRejected as e:
+                if e.engine_result == PAST_SEQUENCE and attempt == 0:
+                    await self.sequences.resync(account)
+                    continue
+                raise
+            # TicketCreate also uses up one sequence number per Ticket it creates.
+            account.take(1 + signed.ticket_count if isinstance(signed, TicketCreate) else 1)
+            if engine_result == FUTURE_SEQUENCE:
+                # We got ahead of the ledger. rippled holds this one until the gap closes.
+                await self.sequences.resync(account)
+            return signed, waiter
+
+    async def _send(self, client, signed) -> tuple[Optional[asyncio.Future], str]:
+        """Submit a signed transaction, registering it with the ledger stream first."""
+        tx_hash = signed.get_hash()
+        waiter = await self.stream.expect(signed.account, tx_hash, signed.last_ledger_sequence)
+        try:
+            response = await submit(signed, client)
+            engine_result = response.result.get("engine_result", "")
+            if engine_result[:3] in ("tem", "tef", "tel"):
+                raise SubmitRejected(engine_result, response.result.get("engine_result_message", ""))
+        except Exception:
+            self.stream.discard(tx_hash)
+            raise
+        return waiter, engine_result
+
+    async def _confirm(self, signed, waiter: Optional[asyncio.Future]) -> dict:
+        tx_hash = signed.get_hash()
+        ticket = signed.ticket_sequence
+        result = None
+        try:
+            if waiter is not None:
+                try:
+                    result = await asyncio.wait_for(waiter, STREAM_CONFIRM_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    self.stream.discard(tx_hash)
+                    logger.warning(f"No stream confirmation for {tx_hash}, falling back to polling")
+            if result is None:
+                async with self.nodes.connection() as client:
+                    result = await self._wait_for_validation(client, tx_hash, signed.last_ledger_sequence)
+        except TransactionExpired:
+            if ticket:
+                # Never applied, so the Ticket is still on the ledger.
+                self.tickets[signed.account].give_back(ticket)
+            else:
+                # The sequence number was never consumed on-ledger, leaving a gap behind it.
+                self.sequences.invalidate(signed.account)
+            raise
+        except Exception:
+            if ticket:
+                # Outcome unknown: the Ticket may or may not have been used. Ask the ledger.
+                self.tickets[signed.account].consumed(ticket)
+                await self._reload_tickets(signed.account)
+            raise
+        if ticket:
+            self.tickets[signed.account].consumed(ticket)
+        return _check_validated(result)
+
+    async def _wait_for_validation(self, client, tx_hash: str, last_ledger_sequence: int) -> dict:
+        """Polling fallback for when the ledger stream is unavailable."""
+        while True:
+            await asyncio.sleep(1)
+            response = await client.request(Tx(transaction=tx_hash))
+            if response.is_successful() and response.result.get("validated"):
+                return response.result
+            if not response.is_successful() and response.result.get("error") != "txnNotFound":
+                raise Exception(f"Failed to get tx: {response.result}")
+            latest = await get_latest_validated_ledger_sequence(client)
+            if latest >= last_ledger_sequence:
+                raise TransactionExpired(
+                    f"Transaction {tx_hash} not validated by LastLedgerSequence {last_ledger_sequence}"
+                )
+
     async def get_rlusd_balance(self, address: str) -> float:
         """Get RLUSD (IOU) balance for an address using AccountLines."""
-        async with AsyncWebsocketClient(self.url) as client:
-            response = await client.request(
-                AccountLines(account=address, peer=settings.RLUSD_ISSUER_ADDRESS)
+        if address in self.platform_addresses:
+            lines = await self.cache.get(
+                ("rlusd_lines", address),
+                lambda: self._fetch_rlusd_lines(address),
+                account=address,
+                sticky=True,
             )
-            if response.is_successful():
-                for line in response.result.get("lines", []):
-                    if line.get("currency") == settings.RLUSD_CURRENCY_HEX:
-                        return float(line.get("balance", "0"))
-            return 0.0
+        else:
+            lines = await self._fetch_rlusd_lines(address)
+        for line in lines.get("lines", []):
+            if line.get("currency") == settings.RLUSD_CURRENCY_HEX:
+                return float(line.get("balance", "0"))
+        return 0.0
+
+    async def _fetch_rlusd_lines(self, address: str) -> dict:
+        response = await self.nodes.request(
+            AccountLines(account=address, peer=settings.RLUSD_ISSUER_ADDRESS, ledger_index="validated")
+        )
+        # An unsuccessful response has no ledger_index, so the cache does not keep it.
+        return response.result if response.is_successful() else {}
 
     async def submit_rlusd_payment(self, wallet: Wallet, destination: str, amount_value: str, memos: list = None) -> dict:
         """Send an RLUSD (IOU) Payment."""
-        async with AsyncWebsocketClient(self.url) as client:
+        amount = IssuedCurrencyAmount(
+            currency=settings.RLUSD_CURRENCY_HEX,
+            issuer=settings.RLUSD_ISSUER_ADDRESS,
+            value=amount_value,
+        )
+        kwargs = {
+            "account": wallet.address,
+            "destination": destination,
+            "amount": amount,
+        }
+        if memos:
+            kwargs["memos"] = memos
+        tx = Payment(**kwargs)
+        return await self._submit_and_confirm(wallet, tx)
+
+    async def set_rlusd_trustline(self, wallet: Wallet, limit_value: str = "1000000") -> dict:
+        """Open an RLUSD TrustLine from the given wallet to the configured issuer."""
+        tx = TrustSet(
+            account=wallet.address,
+            limit_amount=IssuedCurrencyAmount(
+                currency=settings.RLUSD_CURRENCY_HEX,
+                issuer=settings.RLUSD_ISSUER_ADDRESS,
+                value=limit_value,
+            ),
+        )
+        return await self._submit_and_confirm(wallet, tx)
+
+    async def submit_rlusd_payments_batch(self, wallet: Wallet, payment_params: list[dict],
+                                          pipelined: bool = True) -> list[dict]:
+        """Send multiple RLUSD payments from one wallet. Results come back in input order."""
+        txs = []
+        for params in payment_params:
             amount = IssuedCurrencyAmount(
                 currency=settings.RLUSD_CURRENCY_HEX,
                 issuer=settings.RLUSD_ISSUER_ADDRESS,
-                value=amount_value,
+                value=params["amount_value"],
             )
             kwargs = {
                 "account": wallet.address,
-                "destination": destination,
+                "destination": params["destination"],
                 "amount": amount,
             }
-            if memos:
-                kwargs["memos"] = memos
-            tx = Payment(**kwargs)
-            response = await submit_and_wait(tx, client, wallet)
-            return response.result
-
-    async def submit_rlusd_payments_batch(self, wallet: Wallet, payment_params: list[dict]) -> list[dict]:
-        """Send multiple RLUSD payments using a single WebSocket connection with manual sequence numbering."""
-        results = []
-        async with AsyncWebsocketClient(self.url) as client:
-            acct_info = await client.request(AccountInfo(account=wallet.address, ledger_index="current"))
-            if not acct_info.is_successful():
-                raise Exception(f"Failed to get account info: {acct_info.result}")
-            base_sequence = acct_info.result["account_data"]["Sequence"]
+            if params.get("memos"):
+                kwargs["memos"] = params["memos"]
+            txs.append(Payment(**kwargs))
+        return await self._submit_batch(wallet, txs, "RLUSD payment", pipelined)
 
-            for i, params in enumerate(payment_params):
+    async def _ticket_refill_loop(self):
+        for wallet in self.hot_wallets:
+            if wallet.address in self.tickets:
                 try:
-                    amount = IssuedCurrencyAmount(
-                        currency=settings.RLUSD_CURRENCY_HEX,
-                        issuer=settings.RLUSD_ISSUER_ADDRESS,
-                        value=params["amount_value"],
-                    )
-                    kwargs = {
-                        "account": wallet.address,
-                        "destination": params["destination"],
-                        "amount": amount,
-                        "sequence": base_sequence + i,
-                    }
-                    if params.get("memos"):
-                        kwargs["memos"] = params["memos"]
-                    tx = Payment(**kwargs)
-                    tx_filled = await autofill(tx, client)
-                    response = await submit_and_wait(tx_filled, client, wallet, autofill=False)
-                    results.append(response.result)
+                    self.tickets[wallet.address].add(await load_tickets(self.nodes, wallet.address))
                 except Exception as e:
-                    logger.error(f"Batch RLUSD payment #{i} failed: {e}")
-                    results.append({"error": str(e), "index": i})
-        return results
+                    logger.warning(f"Could not load tickets for {wallet.address}: {e}")
+        while True:
+            for wallet in self.hot_wallets:
+                if wallet.address in self.tickets:
+                    await self._refill_tickets(wallet)
+            self._ticket_refill_needed.clear()
+            try:
+                await asyncio.wait_for(self._ticket_refill_needed.wait(), TICKET_REFILL_CHECK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _reload_tickets(self, address: str):
+        try:
+            self.tickets[address].sync(await load_tickets(self.nodes, address))
+        except Exception as e:
+            logger.warning(f"Could not reload tickets for {address}: {e}")
+
+    async def _refill_tickets(self, wallet: Wallet):
+        pool = self.tickets[wallet.address]
+        count = pool.refill_count()
+        if not count:
+            return
+        pool.refilling = True
+        try:
+            result = await self._submit_and_confirm(
+                wallet, TicketCreate(account=wallet.address, ticket_count=count), use_tickets=False
+            )
+            # A TicketCreate at Sequence S creates Tickets S+1 .. S+count.
+            first = (result.get("Sequence") or result.get("tx_json", {}).get("Sequence", 0)) + 1
+            pool.add(range(first, first + count))
+            logger.info(f"Created {count} tickets for {wallet.address} ({len(pool)} available)")
+        except Exception as e:
+            logger.error(f"Ticket refill for {wallet.address} failed: {e}")
+        finally:
+            pool.refilling = False
 
     async def fund_account(self, address: str) -> bool:
         """Fund an account on devnet via faucet."""
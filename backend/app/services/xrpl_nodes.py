@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from xrpl.asyncio.clients import AsyncWebsocketClient
+from xrpl.models.requests import Request
+from xrpl.models.response import Response
+from app.services.xrpl_pool import XRPLConnectionPool, CONNECTION_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Consecutive connection failures after which a node is skipped until it recovers.
+MAX_NODE_FAILURES = 3
+
+
+class XRPLNodeRouter:
+    """
+    Routes requests across several rippled nodes, each with its own connection pool.
+
+    Reads go to the fastest healthy node (lowest latency average, not lagging behind
+    the most advanced node by more than `max_ledger_lag` validated ledgers) and fail
+    over to the next one on connection errors. With hedging on, a read that has not
+    answered within `hedge_delay_ms` is also sent to the runner-up and the first
+    response wins. Submissions and anything sequence-related are pinned to the submit
+    node so our view of the open ledger stays consistent, failing over only while it
+    is unhealthy.
+    """
+
+    def __init__(self, urls: list[str], submit_url: Optional[str] = None, pool_size: int = 4,
+                 max_in_flight: int = 16, health_check_interval: float = 15,
+                 max_ledger_lag: int = 3, hedged_reads: bool = False, hedge_delay_ms: float = 100):
+        urls = list(dict.fromkeys(u for u in urls if u))
+        submit_url = submit_url or urls[0]
+        if submit_url not in urls:
+            urls.insert(0, submit_url)
+        self.nodes = {
+            url: XRPLConnectionPool(url, size=pool_size, max_in_flight=max_in_flight,
+                                    health_check_interval=health_check_interval)
+            for url in urls
+        }
+        self.submit_node = self.nodes[submit_url]
+        self.max_ledger_lag = max_ledger_lag
+        self.hedged_reads = hedged_reads
+        self.hedge_delay = hedge_delay_ms / 1000
+
+    @property
+    def urls(self) -> list[str]:
+        """Node URLs with the submit node first."""
+        return [self.submit_node.url] + [u for u in self.nodes if u != self.submit_node.url]
+
+    def ledger_lag(self, node: XRPLConnectionPool) -> Optional[int]:
+        known = [n.validated_ledger for n in self.nodes.values() if n.validated_ledger is not None]
+        if node.validated_ledger is None or not known:
+            return None
+        return max(known) - node.validated_ledger
+
+    def is_healthy(self, node: XRPLConnectionPool) -> bool:
+        if node.failures >= MAX_NODE_FAILURES or not node.has_open_connection():
+            return False
+        lag = self.ledger_lag(node)
+        return lag is None or lag <= self.max_ledger_lag
+
+    def read_nodes(self) -> list[XRPLConnectionPool]:
+        """All nodes, best read candidate first. Unhealthy ones stay at the back as a last resort."""
+        return sorted(
+            self.nodes.values(),
+            key=lambda n: (
+                not self.is_healthy(n),
+                n.latency_ms is None,
+                n.latency_ms or 0,
+            ),
+        )
+
+    def submit_nodes(self) -> list[XRPLConnectionPool]:
+        if self.is_healthy(self.submit_node):
+            return [self.submit_node] + [n for n in self.read_nodes() if n is not self.submit_node]
+        others = [n for n in self.read_nodes() if n is not self.submit_node]
+        return others + [self.submit_node]
+
+    @asynccontextmanager
+    async def connection(self, pinned: bool = False) -> AsyncIterator[AsyncWebsocketClient]:
+        """Borrow a client from the best read node, or from the submit node when `pinned`."""
+        node = (self.submit_nodes() if pinned else self.read_nodes())[0]
+        if pinned and node is not self.submit_node:
+            logger.warning(f"Submit node {self.submit_node.url} unhealthy, failing over to {node.url}")
+        async with node.connection() as client:
+            yield client
+
+    async def request(self, request: Request, pinned: bool = False) -> Response:
+        if pinned:
+            return await self._with_failover(request, self.submit_nodes())
+        nodes = self.read_nodes()
+        if self.hedged_reads and len(nodes) > 1:
+            return await self._hedged(request, nodes)
+        return await self._with_failover(request, nodes)
+
+    async def _with_failover(self, request: Request, nodes: list[XRPLConnectionPool]) -> Response:
+        for i, node in enumerate(nodes):
+            try:
+                return await node.request(request)
+            except CONNECTION_ERRORS as e:
+                if i == len(nodes) - 1:
+                    raise
+                logger.warning(f"XRPL node {node.url} failed ({e!r}), trying {nodes[i + 1].url}")
+
+    async def _hedged(self, request: Request, nodes: list[XRPLConnectionPool]) -> Response:
+        primary = asyncio.create_task(nodes[0].request(request))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+        if done and primary.exception() is None:
+            return primary.result()
+
+        # Primary is slow or already failed: race the rest of the nodes against it.
+        pending = {primary} if not done else set()
+        pending.add(asyncio.create_task(nodes[1].request(request)))
+        remaining = nodes[2:]
+        error = primary.exception() if done else None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending and remaining:
+                    pending.add(asyncio.create_task(remaining.pop(0).request(request)))
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def start(self):
+        await asyncio.gather(*(n.start() for n in self.nodes.values()))
+
+    async def close(self):
+        await asyncio.gather(*(n.close() for n in self.nodes.values()), return_exceptions=True)
+
+    def status(self) -> list[dict]:
+        return [
+            {
+                "url": node.url,
+                "submit": node is self.submit_node,
+                "healthy": self.is_healthy(node),
+                "latency_ms": round(node.latency_ms, 2) if node.latency_ms is not None else None,
+                "validated_ledger": node.validated_ledger,
+                "ledger_lag": self.ledger_lag(node),
+                "failures": node.failures,
+            }
+            for node in self.nodes.values()
+        ]
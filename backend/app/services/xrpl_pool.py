@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from xrpl.asyncio.clients import AsyncWebsocketClient
+from xrpl.asyncio.clients.exceptions import XRPLWebsocketException
+from xrpl.models.requests import Ping, Request, ServerInfo
+from xrpl.models.response import Response
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the socket itself is gone, as opposed to a rippled-level error response.
+CONNECTION_ERRORS = (XRPLWebsocketException, ConnectionError, OSError, asyncio.TimeoutError)
+
+# Weight of the newest sample in the per-node latency average.
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class PooledConnection:
+    """A single long-lived WebSocket to a rippled node with a cap on in-flight requests."""
+
+    def __init__(self, url: str, index: int, max_in_flight: int):
+        self.url = url
+        self.index = index
+        self.client: Optional[AsyncWebsocketClient] = None
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self._open_lock = asyncio.Lock()
+        self._drain_task: Optional[asyncio.Task] = None
+
+    def is_open(self) -> bool:
+        return self.client is not None and self.client.is_open()
+
+    async def ensure_open(self) -> AsyncWebsocketClient:
+        if self.is_open():
+            return self.client
+        async with self._open_lock:
+            if self.is_open():
+                return self.client
+            await self._discard()
+            client = AsyncWebsocketClient(self.url)
+            await client.open()
+            self.client = client
+            # AsyncWebsocketClient also enqueues every response for `async for` consumers.
+            # Nobody iterates a pooled socket, so drain it or the queue grows forever.
+            self._drain_task = asyncio.create_task(self._drain(client))
+            logger.info(f"XRPL connection #{self.index} opened to {self.url}")
+            return client
+
+    async def _drain(self, client: AsyncWebsocketClient):
+        try:
+            async for _ in client:
+                pass
+        except Exception:
+            pass
+
+    async def _discard(self):
+        if self._drain_task:
+            self._drain_task.cancel()
+            self._drain_task = None
+        if self.client is not None:
+            try:
+                await self.client.close()
+            except Exception:
+                pass
+            self.client = None
+
+    async def reconnect(self):
+        async with self._open_lock:
+            await self._discard()
+        await self.ensure_open()
+
+    async def close(self):
+        async with self._open_lock:
+            await self._discard()
+
+
+class XRPLConnectionPool:
+    """
+    Fixed-size pool of persistent WebSocket connections to one rippled node.
+    Connections open lazily, are checked by a background health loop and are
+    reopened automatically when they drop. The pool also keeps the node's health:
+    a latency average over its requests, its last validated ledger and a count
+    of consecutive failures.
+    """
+
+    def __init__(self, url: str, size: int = 4, max_in_flight: int = 16,
+                 health_check_interval: float = 15, request_timeout: float = 10):
+        self.url = url
+        self.request_timeout = request_timeout
+        self.health_check_interval = health_check_interval
+        self.connections = [PooledConnection(url, i, max_in_flight) for i in range(max(1, size))]
+        self.latency_ms: Optional[float] = None
+        self.validated_ledger: Optional[int] = None
+        self.failures = 0
+        self._health_task: Optional[asyncio.Task] = None
+
+    def has_open_connection(self) -> bool:
+        return any(c.is_open() for c in self.connections)
+
+    def record_latency(self, elapsed_ms: float):
+        if self.latency_ms is None:
+            self.latency_ms = elapsed_ms
+        else:
+            self.latency_ms += LATENCY_EWMA_ALPHA * (elapsed_ms - self.latency_ms)
+
+    def _pick(self) -> PooledConnection:
+        # Prefer open sockets, then the least loaded one.
+        return min(self.connections, key=lambda c: (not c.is_open(), c.in_flight, c.index))
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncWebsocketClient]:
+        """Borrow an open client. Holds one in-flight slot for the duration of the block."""
+        conn = self._pick()
+        async with conn.slots:
+            conn.in_flight += 1
+            try:
+                client = await conn.ensure_open()
+                try:
+                    yield client
+                except CONNECTION_ERRORS:
+                    if not conn.is_open():
+                        logger.warning(f"XRPL connection #{conn.index} dropped, will reconnect")
+                    raise
+            finally:
+                conn.in_flight -= 1
+
+    async def request(self, request: Request) -> Response:
+        """Send a single request, retrying once on a fresh socket if the connection dropped."""
+        for attempt in range(2):
+            try:
+                async with self.connection() as client:
+                    start = time.perf_counter()
+                    response = await asyncio.wait_for(client.request(request), self.request_timeout)
+                    self.record_latency((time.perf_counter() - start) * 1000)
+                    self.failures = 0
+                    return response
+            except CONNECTION_ERRORS:
+                self.failures += 1
+                if attempt == 1:
+                    raise
+
+    async def start(self):
+        results = await asyncio.gather(
+            *(c.ensure_open() for c in self.connections), return_exceptions=True
+        )
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            logger.warning(f"{len(failed)}/{len(self.connections)} XRPL connections failed to open: {failed[0]}")
+        await self._check_node()
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        await asyncio.gather(*(c.close() for c in self.connections), return_exceptions=True)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            await asyncio.gather(*(self._check(c) for c in self.connections), return_exceptions=True)
+            await self._check_node()
+
+    async def _check_node(self):
+        """Refresh the node's validated ledger, which is what ledger lag is measured from."""
+        try:
+            response = await self.request(ServerInfo())
+            if response.is_successful():
+                validated = response.result["info"].get("validated_ledger") or {}
+                self.validated_ledger = validated.get("seq")
+        except Exception as e:
+            logger.warning(f"XRPL node {self.url} failed server_info check: {e}")
+
+    async def _check(self, conn: PooledConnection):
+        try:
+            if not conn.is_open():
+                await conn.ensure_open()
+                return
+            async with conn.slots:
+                await asyncio.wait_for(conn.client.request(Ping()), self.request_timeout)
+        except Exception as e:
+            logger.warning(f"XRPL connection #{conn.index} failed health check ({e}), reconnecting")
+            try:
+                await conn.reconnect()
+            except Exception as e2:
+                logger.error(f"XRPL connection #{conn.index} reconnect failed: {e2}")
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from xrpl.models.requests import AccountInfo
+from app.services.xrpl_nodes import XRPLNodeRouter
+
+logger = logging.getLogger(__name__)
+
+# Engine results that mean our local sequence counter has drifted from the ledger.
+# tefPAST_SEQ is never applied and is safe to resubmit with a fresh number; terPRE_SEQ is
+# held by rippled and may still apply once the gap closes, so it is only resynced.
+PAST_SEQUENCE = "tefPAST_SEQ"
+FUTURE_SEQUENCE = "terPRE_SEQ"
+
+
+class AccountSequence:
+    """Local sequence counter for one account. `queue` serializes its sign-and-submit step."""
+
+    def __init__(self, address: str):
+        self.address = address
+        self.next_sequence: Optional[int] = None
+        self.stale = False
+        # asyncio.Lock wakes waiters in FIFO order, so this doubles as the per-account submit queue.
+        self.queue = asyncio.Lock()
+
+    def take(self, count: int = 1) -> int:
+        sequence = self.next_sequence
+        self.next_sequence += count
+        return sequence
+
+
+class SequenceManager:
+    """
+    Hands out sequence numbers per account so many coroutines can submit from the
+    same wallet without each fetching Sequence and colliding. Only signing and
+    submission hold the account's queue; waiting for validation happens outside it.
+    """
+
+    def __init__(self, nodes: XRPLNodeRouter):
+        self.nodes = nodes
+        self._accounts: dict[str, AccountSequence] = {}
+
+    def _get(self, address: str) -> AccountSequence:
+        if address not in self._accounts:
+            self._accounts[address] = AccountSequence(address)
+        return self._accounts[address]
+
+    @asynccontextmanager
+    async def reserve(self, address: str) -> AsyncIterator[AccountSequence]:
+        """Hold the account's submit queue, syncing the counter from the ledger if needed."""
+        account = self._get(address)
+        async with account.queue:
+            if account.next_sequence is None or account.stale:
+                await self.resync(account)
+            yield account
+
+    def invalidate(self, address: str):
+        """Force a resync from the ledger the next time the account's queue is taken."""
+        account = self._accounts.get(address)
+        if account is not None:
+            account.stale = True
+
+    async def resync(self, account: AccountSequence):
+        # The open ledger we submit into is the submit node's, so read the sequence there too.
+        response = await self.nodes.request(AccountInfo(account=account.address, ledger_index="current"), pinned=True)
+        if not response.is_successful():
+            raise Exception(f"Failed to get account info: {response.result}")
+        sequence = response.result["account_data"]["Sequence"]
+        if account.next_sequence is not None and sequence != account.next_sequence:
+            logger.info(f"Resynced sequence for {account.address}: {account.next_sequence} -> {sequence}")
+        account.next_sequence = sequence
+        account.stale = False
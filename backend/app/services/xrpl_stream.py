@@ -0,0 +1,207 @@
+import asyncio
+import logging
+from typing import Callable, Optional
+from xrpl.asyncio.clients import AsyncWebsocketClient
+from xrpl.models.requests import Subscribe, Unsubscribe, StreamParameter, Tx
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY_SECONDS = 2
+MAX_RECONNECT_DELAY_SECONDS = 30
+
+
+class TransactionExpired(Exception):
+    pass
+
+
+def as_tx_result(message: dict) -> dict:
+    """Shape a stream `transaction` message like a validated Tx response result."""
+    tx = message.get("transaction") or message.get("tx_json") or {}
+    return {
+        **tx,
+        "tx_json": tx,
+        "hash": message.get("hash") or tx.get("hash", ""),
+        "meta": message.get("meta", {}),
+        "ledger_index": message.get("ledger_index"),
+        "validated": True,
+    }
+
+
+class LedgerStream:
+    """
+    One shared subscription to the `ledger` stream and to the platform's accounts.
+    Submitters register a transaction hash before sending it and get back a future
+    that resolves when the transaction shows up in a validated ledger, or fails once
+    the ledger passes its LastLedgerSequence. Given several nodes it stays on the first
+    one that works and moves to the next when the subscription drops.
+    """
+
+    def __init__(self, urls: list[str]):
+        self.urls = urls
+        self.url = urls[0]
+        self.validated_ledger_index: Optional[int] = None
+        self.ledger_close_time: Optional[int] = None  # Ripple epoch seconds
+        self._accounts: set[str] = set()
+        self._pending: dict[str, tuple[asyncio.Future, int]] = {}
+        self._client: Optional[AsyncWebsocketClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: list[Callable[[dict], None]] = []
+
+    def is_connected(self) -> bool:
+        return self._client is not None and self._client.is_open()
+
+    async def start(self, accounts: list[str]):
+        self._accounts.update(a for a in accounts if a)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+    def add_listener(self, callback: Callable[[dict], None]):
+        """Call `callback` with every stream message, plus a synthetic {"type": "subscribed"} on (re)connect."""
+        self._listeners.append(callback)
+
+    def _notify(self, message: dict):
+        for callback in self._listeners:
+            try:
+                callback(message)
+            except Exception as e:
+                logger.error(f"Ledger stream listener failed: {e}")
+
+    async def watch_account(self, address: str):
+        if address in self._accounts:
+            return
+        self._accounts.add(address)
+        if self.is_connected():
+            await self._client.request(Subscribe(accounts=[address]))
+
+    async def unwatch_account(self, address: str):
+        if address not in self._accounts:
+            return
+        self._accounts.discard(address)
+        if self.is_connected():
+            await self._client.request(Unsubscribe(accounts=[address]))
+
+    async def expect(self, account: str, tx_hash: str, last_ledger_sequence: int) -> Optional[asyncio.Future]:
+        """
+        Register interest in a transaction before submitting it. Returns None when the
+        stream is down so the caller can fall back to polling.
+        """
+        if not self.is_connected():
+            return None
+        await self.watch_account(account)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[tx_hash] = (future, last_ledger_sequence)
+        return future
+
+    def discard(self, tx_hash: str):
+        entry = self._pending.pop(tx_hash, None)
+        if entry and not entry[0].done():
+            entry[0].cancel()
+
+    async def _run(self):
+        delay = RECONNECT_DELAY_SECONDS
+        index = 0
+        failed = 0
+        while True:
+            self.url = self.urls[index % len(self.urls)]
+            try:
+                async with AsyncWebsocketClient(self.url) as client:
+                    response = await client.request(
+                        Subscribe(streams=[StreamParameter.LEDGER], accounts=sorted(self._accounts) or None)
+                    )
+                    if not response.is_successful():
+                        raise Exception(f"Subscribe failed: {response.result}")
+                    self._on_ledger(response.result)
+                    self._client = client
+                    self._notify({"type": "subscribed", **response.result})
+                    delay = RECONNECT_DELAY_SECONDS
+                    failed = 0
+                    logger.info(f"Ledger stream subscribed to {self.url} ({len(self._accounts)} accounts)")
+
+                    # Anything that validated while we were disconnected never reached us.
+                    await self._reconcile(client)
+
+                    async for message in client:
+                        self._handle(message)
+                        self._notify(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Ledger stream error on {self.url}: {e}")
+            finally:
+                self._client = None
+            index += 1
+            failed += 1
+            if failed >= len(self.urls):
+                # Every node has been tried once; back off before going round again.
+                failed = 0
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+
+    def _handle(self, message: dict):
+        msg_type = message.get("type")
+        if msg_type == "ledgerClosed":
+            self._on_ledger(message)
+            self._expire()
+        elif msg_type == "transaction" and message.get("validated"):
+            result = as_tx_result(message)
+            entry = self._pending.pop(result["hash"], None)
+            if entry and not entry[0].done():
+                entry[0].set_result(result)
+
+    def _on_ledger(self, message: dict):
+        if "ledger_index" in message:
+            self.validated_ledger_index = message["ledger_index"]
+        if "ledger_time" in message:
+            self.ledger_close_time = message["ledger_time"]
+
+    def _expire(self):
+        # rippled publishes a ledger's transactions before the next ledgerClosed, so anything
+        # still pending once we are past its LastLedgerSequence gets one final lookup.
+        for tx_hash, (future, last_ledger_sequence) in list(self._pending.items()):
+            if self.validated_ledger_index > last_ledger_sequence and not future.done():
+                asyncio.create_task(self._final_check(tx_hash))
+
+    async def _final_check(self, tx_hash: str):
+        entry = self._pending.get(tx_hash)
+        if not entry or not self.is_connected():
+            return
+        future, last_ledger_sequence = entry
+        try:
+            response = await self._client.request(Tx(transaction=tx_hash))
+            if response.is_successful() and response.result.get("validated"):
+                result = response.result
+            else:
+                result = None
+        except Exception as e:
+            logger.warning(f"Final lookup for {tx_hash} failed: {e}")
+            return
+        if self._pending.pop(tx_hash, None) is None or future.done():
+            return
+        if result is not None:
+            future.set_result(result)
+        else:
+            future.set_exception(TransactionExpired(
+                f"Transaction {tx_hash} not validated by LastLedgerSequence {last_ledger_sequence}"
+            ))
+
+    async def _reconcile(self, client: AsyncWebsocketClient):
+        for tx_hash in list(self._pending):
+            try:
+                response = await client.request(Tx(transaction=tx_hash))
+            except Exception:
+                continue
+            if response.is_successful() and response.result.get("validated"):
+                entry = self._pending.pop(tx_hash, None)
+                if entry and not entry[0].done():
+                    entry[0].set_result(response.result)
+        if self.validated_ledger_index is not None:
+            self._expire()
@@ -0,0 +1,85 @@
+import logging
+from collections import deque
+from xrpl.models.requests import AccountObjects, AccountObjectType
+from app.services.xrpl_nodes import XRPLNodeRouter
+
+logger = logging.getLogger(__name__)
+
+# An account can own at most 250 Tickets.
+MAX_TICKETS_PER_ACCOUNT = 250
+
+
+class TicketPool:
+    """
+    Unused Tickets for one hot wallet. A transaction signed with a Ticket instead of a
+    Sequence can validate in any order, so a slow or stuck one does not hold up the rest.
+    """
+
+    def __init__(self, address: str, target: int, low_water: int):
+        self.address = address
+        self.target = min(target, MAX_TICKETS_PER_ACCOUNT)
+        self.low_water = low_water
+        self._available: deque[int] = deque()
+        self._known: set[int] = set()
+        self.refilling = False
+
+    def __len__(self) -> int:
+        return len(self._available)
+
+    def add(self, tickets):
+        for ticket in tickets:
+            if ticket not in self._known:
+                self._known.add(ticket)
+                self._available.append(ticket)
+
+    def take(self, count: int) -> list[int]:
+        taken = []
+        while self._available and len(taken) < count:
+            taken.append(self._available.popleft())
+        return taken
+
+    def give_back(self, ticket: int):
+        """Return a Ticket whose transaction was never applied."""
+        if ticket in self._known and ticket not in self._available:
+            self._available.appendleft(ticket)
+
+    def consumed(self, ticket: int):
+        self._known.discard(ticket)
+
+    def sync(self, on_ledger):
+        """
+        Reconcile with the Tickets the account owns on the validated ledger: forget the
+        ones it no longer owns and make new ones available. Tickets taken for in-flight
+        transactions stay out of the queue.
+        """
+        on_ledger = set(on_ledger)
+        gone = self._known - on_ledger
+        self._known -= gone
+        self._available = deque(t for t in self._available if t not in gone)
+        self.add(sorted(on_ledger))
+
+    def refill_count(self) -> int:
+        if len(self._available) > self.low_water or self.refilling:
+            return 0
+        owned = len(self._known)
+        return max(0, self.target - owned)
+
+
+async def load_tickets(nodes: XRPLNodeRouter, address: str) -> list[int]:
+    """Ticket sequences the account already owns on the validated ledger."""
+    tickets = []
+    marker = None
+    while True:
+        response = await nodes.request(AccountObjects(
+            account=address,
+            type=AccountObjectType.TICKET,
+            ledger_index="validated",
+            limit=400,
+            marker=marker,
+        ))
+        if not response.is_successful():
+            raise Exception(f"Failed to load tickets for {address}: {response.result}")
+        tickets.extend(obj["TicketSequence"] for obj in response.result.get("account_objects", []))
+        marker = response.result.get("marker")
+        if not marker:
+            return sorted(tickets)
@@ -0,0 +1,28 @@
+import os
+import time
+import uuid
+
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    RFC 9562 UUIDv7: 48 bits of Unix milliseconds, then a 12-bit counter and 62 random
+    bits. Ids from one process strictly increase, so primary-key inserts land on the
+    right edge of the B-tree instead of a random page.
+    """
+    global _last_ms, _counter
+    ms = time.time_ns() // 1_000_000
+    if ms > _last_ms:
+        _last_ms = ms
+        # Random start, with headroom for the ids that follow in the same millisecond
+        _counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+    else:
+        # Same millisecond, or the clock stepped back: keep counting from the last id
+        _counter += 1
+        if _counter > 0xFFF:
+            _last_ms += 1
+            _counter = 0
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    return uuid.UUID(int=(_last_ms << 80) | (0x7 << 76) | (_counter << 64) | (0b10 << 62) | rand_b)
@@ -0,0 +1,95 @@
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Recent samples kept per metric for percentile reporting.
+WINDOW_SIZE = 1000
+
+
+class LatencyMetric:
+    """Rolling latency samples for one endpoint or operation, with an optional budget."""
+
+    def __init__(self, name: str, budget_ms: Optional[float] = None):
+        self.name = name
+        self.budget_ms = budget_ms
+        self.samples: deque[float] = deque(maxlen=WINDOW_SIZE)
+        self.count = 0
+        self.over_budget = 0
+        self.errors = 0
+
+    def record(self, elapsed_ms: float, error: bool = False):
+        self.samples.append(elapsed_ms)
+        self.count += 1
+        if error:
+            self.errors += 1
+        if self.budget_ms is not None and elapsed_ms > self.budget_ms:
+            self.over_budget += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        return round(ordered[index], 2)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "budget_ms": self.budget_ms,
+            "over_budget": self.over_budget,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._latencies: dict[str, LatencyMetric] = {}
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, float] = {}
+
+    def latency(self, name: str, budget_ms: Optional[float] = None) -> LatencyMetric:
+        if name not in self._latencies:
+            self._latencies[name] = LatencyMetric(name, budget_ms)
+        elif budget_ms is not None:
+            self._latencies[name].budget_ms = budget_ms
+        return self._latencies[name]
+
+    def increment(self, name: str, value: float = 1):
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        self._gauges[name] = value
+
+    @contextmanager
+    def timed(self, name: str, budget_ms: Optional[float] = None):
+        """Record how long the block took; logs a warning when it overruns its budget."""
+        metric = self.latency(name, budget_ms)
+        start = time.perf_counter()
+        error = False
+        try:
+            yield metric
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            metric.record(elapsed_ms, error)
+            if metric.budget_ms is not None and elapsed_ms > metric.budget_ms:
+                logger.warning(f"{name} took {elapsed_ms:.1f}ms (budget {metric.budget_ms:.0f}ms)")
+
+    def snapshot(self) -> dict:
+        return {
+            "latency": {name: m.snapshot() for name, m in self._latencies.items()},
+            "counters": dict(self._counters),
+            "gauges": dict(self._gauges),
+        }
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,55 @@
+import base64
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PageParams:
+    """`?cursor=&limit=` query parameters, for use as a FastAPI dependency."""
+
+    def __init__(self, cursor: Optional[str] = Query(None),
+                 limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+        self.cursor = cursor
+        self.limit = limit
+
+
+def encode_cursor(created_at: datetime, pk) -> str:
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, pk_column) -> tuple[datetime, object]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), pk_column.type.python_type(pk)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def paginate(db, stmt, created_column, pk_column, page: PageParams, descending: bool = True):
+    """
+    Keyset pagination on (created_at, primary key) for a single-entity select: the
+    page after the cursor, in O(limit) no matter how deep. Returns the rows and the
+    cursor of the next page (None on the last one).
+    """
+    key = tuple_(created_column, pk_column)
+    if page.cursor:
+        after = tuple_(*decode_cursor(page.cursor, pk_column))
+        stmt = stmt.where(key < after if descending else key > after)
+    if descending:
+        stmt = stmt.order_by(created_column.desc(), pk_column.desc())
+    else:
+        stmt = stmt.order_by(created_column, pk_column)
+
+    rows = (await db.execute(stmt.limit(page.limit + 1))).scalars().all()
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_column.key), getattr(last, pk_column.key))
+    return rows, next_cursor
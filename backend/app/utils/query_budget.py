@@ -0,0 +1,81 @@
+import functools
+import inspect
+import logging
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from app.config import settings
+from app.database import engine, replica_engine
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.statements: list[str] = []
+
+    def check(self):
+        if len(self.statements) > self.limit:
+            listing = "\n".join(f"  {i + 1}. {s.splitlines()[0]}" for i, s in enumerate(self.statements))
+            raise QueryBudgetExceeded(
+                f"{self.name} ran {len(self.statements)} queries (budget {self.limit}):\n{listing}"
+            )
+
+
+_current: ContextVar[Optional[QueryCounter]] = ContextVar("query_budget", default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    if counter is not None:
+        counter.statements.append(statement)
+
+
+def query_budget(limit: int):
+    """
+    Declare how many SQL statements an endpoint may run. With QUERY_BUDGET_ENABLED the
+    request fails with QueryBudgetExceeded when it runs more, which is how tests catch
+    N+1 regressions; otherwise the endpoint is returned untouched.
+    """
+    def decorator(func):
+        if not settings.QUERY_BUDGET_ENABLED:
+            return func
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                counter = QueryCounter(func.__qualname__, limit)
+                token = _current.set(counter)
+                try:
+                    result = await func(*args, **kwargs)
+                finally:
+                    _current.reset(token)
+                counter.check()
+                return result
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                counter = QueryCounter(func.__qualname__, limit)
+                token = _current.set(counter)
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    _current.reset(token)
+                counter.check()
+                return result
+        return wrapper
+
+    return decorator
+
+
+if settings.QUERY_BUDGET_ENABLED:
+    for _engine in (engine, replica_engine):
+        if _engine is not None:
+            event.listen(_engine.sync_engine, "before_cursor_execute", _count_query)
+    logger.info("Query budgets enforced")
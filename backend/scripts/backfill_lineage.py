@@ -0,0 +1,37 @@
+"""
+Backfill the donation_lineage table from existing donations, batches and org escrows.
+
+New rows are written as batches finish and emergencies allocate; run this once after
+deploying the table so /api/donations/track also covers earlier history. Safe to
+re-run: rows that already exist are left alone.
+
+Usage:
+    cd backend && python -m scripts.backfill_lineage
+"""
+
+import asyncio
+import os
+import sys
+
+# Add parent to path so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.donation_lineage import DonationLineage  # noqa: E402
+from app.services.lineage import record_lineage  # noqa: E402
+
+
+async def main():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[DonationLineage.__table__])
+    async with SessionLocal() as db:
+        added = await record_lineage(db)
+        await db.commit()
+        total = await db.scalar(select(func.count(DonationLineage.id)))
+        print(f"Added {added} lineage rows ({total} total)")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,174 @@
+"""
+Compare query plans for the hot donation/escrow queries under the old single-column
+indexes and the composite/partial set from migration 4.
+
+Builds a synthetic dataset (10M donations by default) in a scratch `index_bench`
+schema shaped like the app tables, runs EXPLAIN (ANALYZE, BUFFERS) on each query with
+the old indexes, swaps in the new ones and runs them again. The app's own tables are
+not touched; the schema is dropped at the end unless --keep is given.
+
+Usage:
+    cd backend && python -m scripts.benchmark_indexes [--donations 10000000] [--keep]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add parent to path so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from app.database import engine  # noqa: E402
+from app.migrations import migrate  # noqa: E402
+
+SCHEMA = "index_bench"
+
+# (name, definition) as declared before migration 4
+OLD_INDEXES = [
+    ("ix_donations_donor_address", "donations (donor_address)"),
+    ("ix_donations_batch_status", "donations (batch_status)"),
+    ("ix_donations_batch_id", "donations (batch_id)"),
+    ("ix_org_escrows_disaster_id", "org_escrows (disaster_id)"),
+    ("ix_org_escrows_status", "org_escrows (status)"),
+    ("ix_org_escrows_status_finish_after", "org_escrows (status, finish_after)"),
+]
+
+NEW_INDEXES = [
+    "CREATE INDEX ON donations (currency, created_at, id) INCLUDE (amount_drops) WHERE batch_status = 'pending'",
+    "CREATE INDEX ON donations (batch_id) WHERE batch_status = 'sealing'",
+    "CREATE INDEX ON donations (batch_id)",
+    "CREATE INDEX ON donations (donor_address, created_at, id)",
+    "CREATE INDEX ON org_escrows (finish_after, disaster_id) WHERE status = 'locked'",
+    "CREATE INDEX ON org_escrows (disaster_id, status)",
+    "CREATE INDEX ON disasters (created_at, disaster_id)",
+]
+
+# (name, sql) mirroring the ORM queries in batch_manager, escrow_scheduler and the routers
+QUERIES = [
+    ("check_triggers",
+     "SELECT count(id), coalesce(sum(amount_drops), 0) FROM donations"
+     " WHERE batch_status = 'pending' AND currency = 'XRP'"),
+    ("plan_chunks",
+     "SELECT created_at, id, amount_drops FROM donations"
+     " WHERE batch_status = 'pending' AND currency = 'XRP' AND created_at <= now()"
+     " ORDER BY created_at, id"),
+    ("recover_stale_claims",
+     "SELECT batch_id, count(id), sum(amount_drops) FROM donations"
+     " WHERE batch_status = 'sealing' GROUP BY batch_id"),
+    ("donor_status_page",
+     "SELECT * FROM donations WHERE donor_address = 'rDonor42'"
+     " ORDER BY created_at DESC, id DESC LIMIT 51"),
+    ("donor_status_total",
+     "SELECT coalesce(sum(amount_drops), 0) FROM donations WHERE donor_address = 'rDonor42'"),
+    ("scheduler_load",
+     "SELECT DISTINCT disaster_id, finish_after FROM org_escrows WHERE status = 'locked'"),
+    ("finish_disaster_lane",
+     "SELECT * FROM org_escrows WHERE disaster_id = 'dis-7' AND status = 'locked'"
+     " AND finish_after < 2000000000"),
+    ("complete_if_done",
+     "SELECT disaster_id, count(id) FROM org_escrows"
+     " WHERE disaster_id IN ('dis-7', 'dis-8', 'dis-9') AND status = 'locked' GROUP BY disaster_id"),
+    ("emergencies_page",
+     "SELECT * FROM disasters ORDER BY created_at DESC, disaster_id DESC LIMIT 51"),
+    ("lineage_disaster_range",
+     "SELECT disaster_id FROM disasters WHERE created_at >= now() - interval '1 day'"),
+]
+
+
+async def build_dataset(conn, donations: int):
+    disasters = max(donations // 200, 100)
+    org_escrows = disasters * 3
+    for table in ("donations", "org_escrows", "disasters"):
+        await conn.execute(text(f"CREATE TABLE {table} (LIKE public.{table} INCLUDING DEFAULTS)"))
+        await conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY ({'disaster_id' if table == 'disasters' else 'id'})"))
+
+    # A year of donations from 50k donors: ~1% pending, a handful sealing, 10% RLUSD
+    await conn.execute(text(f"""
+        INSERT INTO donations (id, donor_address, amount_drops, payment_tx_hash, batch_id, currency, batch_status, created_at)
+        SELECT gen_random_uuid(), 'rDonor' || (i % 50000), 1000000 + (i % 97) * 10000, 'tx' || i,
+               CASE WHEN i % 100 = 0 THEN NULL ELSE 'batch-' || (i / 500) END,
+               CASE WHEN i % 10 = 0 THEN 'RLUSD' ELSE 'XRP' END,
+               CASE WHEN i % 100 = 0 THEN 'pending' WHEN i % 100000 = 1 THEN 'sealing'
+                    WHEN i % 10 = 0 THEN 'direct' ELSE 'distributed' END,
+               now() - (({donations} - i) * interval '1 second' * 31536000 / {donations})
+        FROM generate_series(1, {donations}) AS i
+    """))
+    await conn.execute(text(f"""
+        INSERT INTO disasters (disaster_id, wallet_address, wallet_seed_encrypted, disaster_type, location,
+                               severity, total_allocated_drops, status, created_at)
+        SELECT 'dis-' || i, 'rDisaster' || i, 'x', 'flood', 'bench', 1 + i % 10, 1000000000,
+               CASE WHEN i % 50 = 0 THEN 'active' ELSE 'completed' END,
+               now() - (({disasters} - i) * interval '1 second' * 31536000 / {disasters})
+        FROM generate_series(1, {disasters}) AS i
+    """))
+    # ~2% of org escrows still locked
+    await conn.execute(text(f"""
+        INSERT INTO org_escrows (id, disaster_id, org_id, org_address, escrow_tx_hash, amount_drops, currency,
+                                 status, finish_after, created_at)
+        SELECT gen_random_uuid(), 'dis-' || (1 + i / 3), 1 + i % 3, 'rOrg' || (i % 3), 'etx' || i, 300000000, 'XRP',
+               CASE WHEN i % 50 = 0 THEN 'locked' ELSE 'finished' END,
+               800000000 + i, now()
+        FROM generate_series(0, {org_escrows - 1}) AS i
+    """))
+
+
+async def explain_all(conn, label: str):
+    await conn.execute(text("ANALYZE donations, org_escrows, disasters"))
+    print(f"\n===== {label} =====")
+    for name, sql in QUERIES:
+        plan = (await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"))).scalars().all()
+        print(f"\n--- {name}")
+        print("\n".join(plan))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--donations", type=int, default=10_000_000)
+    parser.add_argument("--keep", action="store_true", help="leave the index_bench schema in place")
+    args = parser.parse_args()
+
+    await migrate()
+    async with engine.connect() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.execute(text(f"SET search_path TO {SCHEMA}, public"))
+        await conn.commit()
+
+        start = time.perf_counter()
+        await build_dataset(conn, args.donations)
+        await conn.commit()
+        print(f"Built {args.donations} donations in {time.perf_counter() - start:.0f}s")
+
+        for name, definition in OLD_INDEXES:
+            await conn.execute(text(f"CREATE INDEX {name} ON {definition}"))
+        await conn.commit()
+        await explain_all(conn, "old indexes")
+
+        for name, _ in OLD_INDEXES:
+            await conn.execute(text(f"DROP INDEX {name}"))
+        start = time.perf_counter()
+        for sql in NEW_INDEXES:
+            await conn.execute(text(sql))
+        await conn.commit()
+        print(f"\nBuilt new indexes in {time.perf_counter() - start:.0f}s")
+        await explain_all(conn, "new indexes")
+
+        sizes = (await conn.execute(text(
+            "SELECT indexrelname, pg_size_pretty(pg_relation_size(indexrelid)) FROM pg_stat_user_indexes"
+            " WHERE schemaname = :schema ORDER BY relname, indexrelname"
+        ), {"schema": SCHEMA})).all()
+        print("\n===== index sizes =====")
+        for name, size in sizes:
+            print(f"{name}: {size}")
+
+        if not args.keep:
+            await conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+            await conn.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
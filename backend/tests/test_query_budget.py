@@ -0,0 +1,172 @@
+"""
+Query budgets of the read endpoints, against a real Postgres with several rows per
+table so that an N+1 shows up as more statements than the declared budget.
+
+Needs TEST_DATABASE_URL (a scratch database: it is migrated, and the rows added here
+are deleted afterwards):
+
+    cd backend && TEST_DATABASE_URL=postgresql://... python -m pytest tests
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+if not os.environ.get("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL not set", allow_module_level=True)
+
+# Budgets are only enforced if enabled before the routers are imported
+os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
+os.environ["DATABASE_REPLICA_URL"] = ""
+os.environ["QUERY_BUDGET_ENABLED"] = "1"
+
+from sqlalchemy import delete  # noqa: E402
+from app.database import ReadSessionLocal, SessionLocal, engine  # noqa: E402
+from app.migrations import migrate  # noqa: E402
+from app.models.batch_escrow import BatchEscrow  # noqa: E402
+from app.models.disaster import Disaster  # noqa: E402
+from app.models.donation import Donation  # noqa: E402
+from app.models.donation_lineage import DonationLineage  # noqa: E402
+from app.models.org_escrow import OrgEscrow  # noqa: E402
+from app.models.organization import Organization  # noqa: E402
+from app.routers.donation_tracking import track_donations  # noqa: E402
+from app.routers.donations import get_donor_status  # noqa: E402
+from app.routers.emergencies import get_disaster, list_disasters  # noqa: E402
+from app.services.lineage import record_lineage  # noqa: E402
+from app.utils.ids import uuid7  # noqa: E402
+from app.utils.pagination import PageParams  # noqa: E402
+from app.utils.query_budget import QueryBudgetExceeded, query_budget  # noqa: E402
+
+DONATIONS = 4
+DISASTERS = 3
+ORGS = 2
+
+
+def run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            # asyncpg connections belong to the loop that opened them
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def _seed(tag: str) -> dict:
+    await migrate()
+    now = datetime.now(timezone.utc)
+    async with SessionLocal() as db:
+        orgs = [
+            Organization(name=f"org-{tag}-{i}", cause_type="health", wallet_address=f"rOrg{tag}{i}", need_score=5)
+            for i in range(ORGS)
+        ]
+        db.add_all(orgs)
+        batch = BatchEscrow(
+            batch_id=f"batch_{tag}", escrow_tx_hash=f"btx{tag}", finish_tx_hash=f"bftx{tag}",
+            total_amount_drops=DONATIONS * 10_000_000, donor_count=1, status="finished",
+            finish_after=0, created_at=now - timedelta(hours=2), finished_at=now - timedelta(hours=1),
+        )
+        db.add(batch)
+        donor = f"rDonor{tag}"
+        db.add_all([
+            Donation(
+                donor_address=donor, amount_drops=10_000_000, payment_tx_hash=f"dtx{tag}{i}",
+                batch_id=batch.batch_id, batch_status="distributed",
+                created_at=now - timedelta(hours=3, minutes=i),
+            )
+            for i in range(DONATIONS)
+        ])
+        await db.flush()
+
+        disaster_ids = []
+        for d in range(DISASTERS):
+            disaster_id = f"disaster_{tag}_{d}"
+            disaster_ids.append(disaster_id)
+            db.add(Disaster(
+                disaster_id=disaster_id, wallet_address=f"rDisaster{tag}{d}", wallet_seed_encrypted="x",
+                disaster_type="flood", location="test", severity=5,
+                total_allocated_drops=ORGS * 5_000_000, status="active", created_at=now - timedelta(minutes=d),
+            ))
+            await db.flush()
+            db.add_all([
+                OrgEscrow(
+                    disaster_id=disaster_id, org_id=org.org_id, org_address=org.wallet_address,
+                    escrow_tx_hash=f"etx{tag}{d}{i}", amount_drops=5_000_000,
+                    status="finished" if i == 0 else "locked", finish_after=0,
+                )
+                for i, org in enumerate(orgs)
+            ])
+        await db.flush()
+        await record_lineage(db, disaster_ids=disaster_ids)
+        await db.commit()
+    return {
+        "donor": donor,
+        "batch_id": batch.batch_id,
+        "disaster_ids": disaster_ids,
+        "org_ids": [o.org_id for o in orgs],
+    }
+
+
+async def _cleanup(seeded: dict):
+    async with SessionLocal() as db:
+        await db.execute(delete(DonationLineage).where(DonationLineage.disaster_id.in_(seeded["disaster_ids"])))
+        await db.execute(delete(OrgEscrow).where(OrgEscrow.disaster_id.in_(seeded["disaster_ids"])))
+        await db.execute(delete(Disaster).where(Disaster.disaster_id.in_(seeded["disaster_ids"])))
+        await db.execute(delete(Donation).where(Donation.donor_address == seeded["donor"]))
+        await db.execute(delete(BatchEscrow).where(BatchEscrow.batch_id == seeded["batch_id"]))
+        await db.execute(delete(Organization).where(Organization.org_id.in_(seeded["org_ids"])))
+        await db.commit()
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    data = run(_seed(uuid7().hex[-12:]))
+    yield data
+    run(_cleanup(data))
+
+
+def _page():
+    return PageParams(cursor=None, limit=50)
+
+
+# (endpoint, declared budget, keyword arguments other than db)
+CASES = [
+    (list_disasters, 3, lambda s: {"page": _page()}),
+    (get_disaster, 1, lambda s: {"disaster_id": s["disaster_ids"][0]}),
+    (track_donations, 3, lambda s: {"donor_address": s["donor"], "page": _page()}),
+    (get_donor_status, 2, lambda s: {"address": s["donor"], "page": _page()}),
+]
+
+
+async def _call(endpoint, **kwargs):
+    async with ReadSessionLocal() as db:
+        return await endpoint(db=db, **kwargs)
+
+
+@pytest.mark.parametrize("endpoint, budget, kwargs", CASES, ids=[c[0].__name__ for c in CASES])
+def test_within_budget(seeded, endpoint, budget, kwargs):
+    assert hasattr(endpoint, "__wrapped__"), "query budget not enforced"
+    result = run(_call(endpoint, **kwargs(seeded)))
+    assert result
+
+
+@pytest.mark.parametrize("endpoint, budget, kwargs", CASES, ids=[c[0].__name__ for c in CASES])
+def test_one_under_budget_fails(seeded, endpoint, budget, kwargs):
+    tighter = query_budget(budget - 1)(endpoint.__wrapped__)
+    with pytest.raises(QueryBudgetExceeded):
+        run(_call(tighter, **kwargs(seeded)))
+
+
+def test_seeded_rows_are_returned(seeded):
+    tracking = run(_call(track_donations, donor_address=seeded["donor"], page=_page()))
+    assert tracking["total_donations"] == DONATIONS
+    assert len(tracking["donations"]) == DONATIONS
+    assert all(len(d["disaster_allocations"]) == DISASTERS for d in tracking["donations"])
+
+    disaster = run(_call(get_disaster, disaster_id=seeded["disaster_ids"][0]))
+    assert len(disaster["org_escrows"]) == ORGS
+
+    status = run(_call(get_donor_status, address=seeded["donor"], page=_page()))
+    assert len(status["donations"]) == DONATIONS
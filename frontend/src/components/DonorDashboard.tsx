@@ -80,14 +80,9 @@ export default function DonorDashboard({ wallet }: Props) {
       ])
 
       setTrackedDonations(tracking.donations || [])
-      const xrpTotal = tracking.donations
-        .filter((d: TrackedDonation) => (d.currency || 'XRP') === 'XRP')
-        .reduce((sum: number, d: TrackedDonation) => sum + d.amount_xrp, 0)
-      const rlusdTotal = tracking.donations
-        .filter((d: TrackedDonation) => d.currency === 'RLUSD')
-        .reduce((sum: number, d: TrackedDonation) => sum + d.amount_xrp, 0)
-      setTotalDonated(xrpTotal)
-      setTotalRlusdDonated(rlusdTotal)
+      // Server-side totals: the list above is only the most recent page
+      setTotalDonated(tracking.total_donated_xrp || 0)
+      setTotalRlusdDonated(tracking.total_donated_rlusd || 0)
       // Show RESERVE balance (the actual emergency fund) instead of pool
       setPoolBalance(xrpl.accounts?.reserve?.balance_xrp || 0)
 
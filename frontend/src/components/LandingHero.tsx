@@ -16,12 +16,11 @@ export default function LandingHero({ onConnect }: Props) {
   useEffect(() => {
     async function load() {
       try {
-        const [dis, orgRes] = await Promise.all([api.getDisasters(), api.getOrganizations()])
-        const disasters = dis.disasters || []
+        const [dis, orgs] = await Promise.all([api.getDisasters(), api.getAllOrganizations()])
         setStats({
-          distributed: disasters.reduce((s: number, d: any) => s + (d.total_allocated_xrp || 0), 0),
-          disasters: disasters.length,
-          orgs: (orgRes.organizations || []).length,
+          distributed: dis.total_allocated_xrp || 0,
+          disasters: dis.total_disasters || 0,
+          orgs: orgs.length,
         })
       } catch { /* silent */ }
     }
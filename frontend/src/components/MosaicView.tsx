@@ -34,7 +34,6 @@ export default function MosaicView() {
       const disasters: DisasterInfo[] = disasterRes.disasters || []
 
       const allTiles: TileData[] = []
-      let totalXrp = 0
       const orgSet = new Set<number>()
 
       for (const d of disasters) {
@@ -43,7 +42,6 @@ export default function MosaicView() {
           const escrows: OrgEscrowInfo[] = detail.org_escrows || []
           for (const e of escrows) {
             allTiles.push({ disaster: d, escrow: e })
-            totalXrp += e.amount_xrp
             orgSet.add(e.org_id)
           }
         } catch {
@@ -53,8 +51,9 @@ export default function MosaicView() {
 
       setTiles(allTiles)
       setStats({
-        totalDistributed: totalXrp,
-        disasterCount: disasters.length,
+        // Tiles cover the latest page of disasters; the totals come from the server
+        totalDistributed: (disasterRes.total_allocated_xrp || 0) + (disasterRes.total_allocated_rlusd || 0),
+        disasterCount: disasterRes.total_disasters || 0,
         orgCount: orgSet.size,
       })
     } catch {
@@ -37,8 +37,7 @@ export default function OrgDashboard({ orgEmail, isWalletConnected, connectedWal
   const loadOrgData = async () => {
     try {
       // Load all orgs
-      const orgRes = await api.getOrganizations()
-      const organizations = orgRes.organizations || []
+      const organizations = await api.getAllOrganizations()
       setOrgs(organizations)
 
       // Auto-select first org for demo
@@ -50,10 +49,10 @@ export default function OrgDashboard({ orgEmail, isWalletConnected, connectedWal
         setAvailableXRP(org.total_received_xrp || 0)
 
         // Calculate locked amount from disasters (escrows not yet finished)
-        const disasters = await api.getDisasters()
+        const disasters = await api.getAllDisasters()
         let locked = 0
 
-        for (const disaster of disasters.disasters || []) {
+        for (const disaster of disasters) {
           try {
             const detail = await api.getDisaster(disaster.disaster_id)
             const orgEscrows = (detail.org_escrows || []).filter(
@@ -49,12 +49,11 @@ export default function OrganizationsView() {
 
   const loadOrgs = async () => {
     try {
-      const [orgRes, xrpl] = await Promise.all([
-        api.getOrganizations(),
+      const [organizations, xrpl] = await Promise.all([
+        api.getAllOrganizations() as Promise<Organization[]>,
         api.getXRPLStatus(),
       ])
 
-      const organizations: Organization[] = orgRes.organizations || []
       setOrgs(organizations)
       setXrplStatus(xrpl)
       setPoolRlusdBalance(xrpl.accounts?.pool?.balance_rlusd || 0)
@@ -73,8 +72,7 @@ export default function OrganizationsView() {
   const loadOrgDetails = async (org: Organization) => {
     try {
       // Get all disasters and filter escrows for this org
-      const disasters = await api.getDisasters()
-      const disasterList = disasters.disasters || []
+      const disasterList = await api.getAllDisasters()
 
       const escrowDetails: OrgEscrowDetail[] = []
       let lXrp = 0
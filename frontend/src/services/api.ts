@@ -12,6 +12,21 @@ async function request<T>(path: string, options?: RequestInit): Promise<T> {
   return res.json()
 }
 
+// List endpoints are keyset-paginated: pass the previous response's next_cursor for the next page
+const pageQuery = (cursor?: string) => (cursor ? `?cursor=${encodeURIComponent(cursor)}` : '')
+
+// Every page of a list endpoint, for views that need the full set rather than the first page
+async function allPages<T>(fetchPage: (cursor?: string) => Promise<any>, key: string): Promise<T[]> {
+  const items: T[] = []
+  let cursor: string | undefined
+  do {
+    const page = await fetchPage(cursor)
+    items.push(...(page[key] || []))
+    cursor = page.next_cursor || undefined
+  } while (cursor)
+  return items
+}
+
 // Donations
 export const prepareDonation = (donor_address: string, amount_xrp: number) =>
   request<any>('/donations/prepare', {
@@ -31,36 +46,52 @@ export const confirmDonation = (tx_hash: string, donor_address: string) =>
     body: JSON.stringify({ tx_hash, donor_address }),
   })
 
-export const getDonorStatus = (address: string) =>
-  request<any>(`/donations/status/${address}`)
+export const getDonorStatus = (address: string, cursor?: string) =>
+  request<any>(`/donations/status/${address}${pageQuery(cursor)}`)
 
-export const trackDonations = (donor_address: string) =>
-  request<any>(`/donations/track/${donor_address}`)
+export const trackDonations = (donor_address: string, cursor?: string) =>
+  request<any>(`/donations/track/${donor_address}${pageQuery(cursor)}`)
 
 // Batches
-export const getBatches = () => request<any>('/batches')
+export const getBatches = (cursor?: string) => request<any>(`/batches${pageQuery(cursor)}`)
 export const getBatchDetail = (batchId: string) => request<any>(`/batches/${batchId}`)
 
 // Emergencies
-export const triggerEmergency = (data: {
+export const getEmergencyJob = (jobId: string) =>
+  request<any>(`/emergencies/jobs/${jobId}`)
+
+// Triggers run as background jobs; poll until the job settles and return its result
+export const triggerEmergency = async (data: {
   disaster_type: string
   location: string
   severity: number
   affected_causes: string[]
   currency?: string
-}) =>
-  request<any>('/emergencies/trigger', {
+}) => {
+  const { job_id } = await request<any>('/emergencies/trigger', {
     method: 'POST',
     body: JSON.stringify(data),
   })
+  while (true) {
+    await new Promise((resolve) => setTimeout(resolve, 1000))
+    const job = await getEmergencyJob(job_id)
+    if (job.status === 'completed') return job.result
+    if (job.status === 'failed' || job.status === 'interrupted') {
+      throw new Error(job.error || `Emergency job ${job.status}`)
+    }
+  }
+}
 
 export const getDisaster = (disasterId: string) =>
   request<any>(`/emergencies/${disasterId}`)
 
-export const getDisasters = () => request<any>('/emergencies')
+export const getDisasters = (cursor?: string) => request<any>(`/emergencies${pageQuery(cursor)}`)
+export const getAllDisasters = () => allPages<any>(getDisasters, 'disasters')
 
 // Organizations
-export const getOrganizations = () => request<any>('/organizations')
+export const getOrganizations = (cursor?: string) =>
+  request<any>(`/organizations${pageQuery(cursor)}`)
+export const getAllOrganizations = () => allPages<any>(getOrganizations, 'organizations')
 
 // XRPL
 export const getXRPLStatus = () => request<any>('/xrpl/status')
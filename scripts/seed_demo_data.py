@@ -1,20 +1,24 @@
 """Seed demo data for the Emergency Impact Platform."""
+import asyncio
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from app.database import SessionLocal, Base, engine
+from sqlalchemy import select
+from app.database import SessionLocal, engine
+from app.migrations import migrate
 from app.models.organization import Organization
 
 
-def seed():
-    Base.metadata.create_all(bind=engine)
+async def seed():
+    await migrate()
     db = SessionLocal()
 
     try:
-        if db.query(Organization).count() > 0:
+        existing = (await db.execute(select(Organization))).scalars().all()
+        if existing:
             print("Organizations already seeded")
-            for org in db.query(Organization).all():
+            for org in existing:
                 print(f"  - {org.name} ({org.cause_type}) - {org.wallet_address}")
             return
 
@@ -33,18 +37,19 @@ def seed():
 
         for org in orgs:
             db.add(org)
-        db.commit()
+        await db.commit()
 
         print("Seeded 3 organizations:")
         for org in orgs:
             print(f"  - {org.name} ({org.cause_type}, need_score={org.need_score}) -> {org.wallet_address}")
 
     finally:
-        db.close()
+        await db.close()
+        await engine.dispose()
 
 
 if __name__ == "__main__":
-    seed()
+    asyncio.run(seed())
     print("\nDone! Start the platform with:")
     print("  Terminal 1: cd backend && source ../venv/bin/activate && uvicorn app.main:app --reload")
     print("  Terminal 2: cd frontend && npm run dev")